@@ -2,58 +2,232 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import numpy as np
-
-# Cache data loading with a TTL of 1 hour (3600 seconds)
-@st.cache_data(ttl=3600)
-def load_data(file_url):
-    return pd.read_csv(file_url)
-
-# Retrieve the DATA_LINK from Streamlit Secrets
-file_url = st.secrets["DATA_LINK"]
-df = load_data(file_url)
-
-# Remove any slug which contains the word 'subscription'
-df = df[~df['slug'].str.contains('subscription', case=False, na=False)]
-
-
-# retrieve the last updated timestamp
+from datetime import date
+from current_view import build_current_view, read_current_view, read_scd_current
+from pareto import pareto_layers
+from categories import categorise
+from price_history import build_history, read_history, read_scd_history, history_steps, delisted_since, HistoryIndex
+from changes import read_changes
+from search_index import SearchIndex
+from remote_data import fetch
+from scatter_plot import jitter, thin_points, render_mode
+from cache_stats import CacheStats
+from profiling import Profiler, profiling_enabled
+
+# Stage timings of this rerun, when the PROFILE secret or QANTASWINE_PROFILE is set (see profiling.py)
+profiler = Profiler(profiling_enabled(st.secrets.get("PROFILE")))
+
+# Most frontier layers a user can ask for
+max_frontier_layers = 3
+
+# The data files are kept locally and only downloaded again when they changed (see remote_data.py).
+# LAST_UPDATED changes with every pipeline run, so it is checked every minute and is part of the cache keys
+# below: a new version of the data is loaded as soon as it is published, not when the hour is up
+@st.cache_data(ttl=60)
+def load_last_updated(last_updated_url):
+    # read the text from the url
+    return pd.read_csv(fetch(last_updated_url)[0], header=None).iloc[0, 0]
+
+# Cache data loading with a TTL of 1 hour (3600 seconds), and for each version of the data
+@st.cache_data(ttl=3600, max_entries=2)
+def load_data(file_url, current_view_url=None, version=None):
+    with profiler.stage('read'):
+        if current_view_url:
+            # the current view precomputed by 05_scd.py, with the derived columns and wine URLs already in it
+            df = read_current_view(fetch(current_view_url)[0])
+        else:
+            # otherwise build it from the current rows of the scd file
+            df = build_current_view(read_scd_current(fetch(file_url)[0]))
+
+    # The frontier layers don't depend on the price threshold (see pareto_layers), so they're worked out once per load
+    with profiler.stage('frontier_layers'):
+        costs = np.column_stack([df['price_per_bottle'].to_numpy(), df['cents_per_point'].to_numpy()])
+        df['frontier_layer'] = pareto_layers(costs, max_frontier_layers).astype('int8')
+    return df
+
+# The history index is shared by all sessions rather than copied into each one
+@st.cache_resource(ttl=3600, max_entries=2)
+def load_history(file_url, history_url=None, version=None):
+    with profiler.stage('read'):
+        if history_url:
+            # the per wine history written by 05_scd.py, already sorted by wine_key
+            return HistoryIndex(read_history(fetch(history_url)[0]))
+        return HistoryIndex(build_history(read_scd_history(fetch(file_url)[0])))
+
+# What changed from one snapshot date to the next, precomputed by 05_scd.py
+@st.cache_data(ttl=3600, max_entries=2)
+def load_changes(changes_url, version=None):
+    with profiler.stage('read'):
+        return read_changes(fetch(changes_url)[0])
+
+# The search index is built once per dataset and shared by all sessions, keyed on the version of the data
+# like filter_wines rather than on a hash of df_hist
+@st.cache_resource(ttl=3600, max_entries=2)
+def load_search_index(_df, version):
+    return SearchIndex(_df['wine_name'], _df['cents_per_point'])
+
+# The price history figure of one wine, keyed on the version of the data, the wine and the day (open versions
+# run until today), so reruns from the search box or the form don't draw it again
+@st.cache_data(ttl=3600, max_entries=64)
+def history_figure(_history_index, version, wine_key, today):
+    df_wine = _history_index.lookup(wine_key)
+    history_fig = px.line(
+        history_steps(df_wine, pd.Timestamp(today)),
+        x='date',
+        y='value',
+        facet_row='measure',
+        line_shape='hv',
+        markers=True,
+        labels={'date': 'Date', 'value': ''}
+    )
+    history_fig.update_yaxes(matches=None, rangemode='tozero')
+    history_fig.for_each_annotation(lambda a: a.update(text=a.text.split('=')[-1]))
+    return history_fig, delisted_since(df_wine)
+
+# Hit and miss counters of the cached functions, shared by all sessions
+@st.cache_resource
+def cache_stats(name):
+    return CacheStats(name)
+
+# Everything from the filters to the figure only depends on the data and the sidebar form, so reruns from the
+# search box or the price history selectbox reuse it instead of working it out again. The entries are keyed on
+# the version of the data (df_hist itself isn't hashed) and the form inputs, and the least recently used go first
+filter_stats = cache_stats('filter_wines')
+
+@st.cache_data(ttl=3600, max_entries=32)
+def filter_wines(_df_hist, version, price_threshold, categories_to_show, frontier_layers=1):
+    filter_stats.miss()
+
+    # Filter the DataFrame based on user input
+    with profiler.stage('filter'):
+        filtered_df = _df_hist[_df_hist['price_per_bottle'] <= price_threshold].copy()
+
+    # The frontier layers under the price threshold were already worked out when the data was loaded. Wines with the
+    # same price_per_bottle and cents_per_point share a layer, so the ties of a Pareto-efficient wine are marked too
+    with profiler.stage('categorise'):
+        filtered_df['is_pareto_efficient'] = filtered_df['frontier_layer'].between(1, frontier_layers)
+
+        # Corrected categorisation based on availability and Pareto efficiency
+        filtered_df['category'] = categorise(filtered_df['is_pareto_efficient'], filtered_df['rec_deleted_flag'])
+
+    # Filter based on the selected categories
+    filtered_df = filtered_df[filtered_df['category'].isin(list(categories_to_show))]
+
+    # Add noise for plotting, but keep original values. The noise comes from the wine_key, so a wine stays put between reruns
+    with profiler.stage('jitter'):
+        price_noise, cents_noise = jitter(filtered_df['wine_key'])
+        filtered_df['plot_price_per_bottle'] = filtered_df['price_per_bottle'] + price_noise
+        filtered_df['plot_cents_per_point'] = filtered_df['cents_per_point'] + cents_noise
+
+    # Large catalogues are drawn with WebGL, and only a sample of the wines that aren't Pareto-efficient is drawn (see scatter_plot.py)
+    with profiler.stage('thin'):
+        plot_df = filtered_df[thin_points(filtered_df, filtered_df['is_pareto_efficient'])]
+
+    with profiler.stage('figure'):
+        # Define colours that work well on a dark background
+        color_discrete_map = {
+            'Available': '#1f77b4',  # Bright blue
+            'Available and Pareto-efficient': '#ff7f0e',  # Orange
+            'Unavailable': '#d62728',  # Bright red
+            'Unavailable and Pareto-efficient': '#9467bd'  # Purple
+        }
+
+        # Scatter Plot using Plotly
+        fig = px.scatter(
+            plot_df, 
+            x='plot_price_per_bottle', 
+            y='plot_cents_per_point', 
+            hover_name='wine_name',
+            hover_data={'price_per_bottle': True, 'cents_per_point': True, 'plot_price_per_bottle': False, 'plot_cents_per_point': False, 'frontier_layer': frontier_layers > 1},  # Show original values on hover
+            custom_data=['url'],  # Add URL to custom_data for click event
+            color='category',
+            labels={
+                'plot_price_per_bottle': 'Price per Bottle ($)', 
+                'plot_cents_per_point': 'Cents per Qantas Point',
+                'category': 'Category',
+                'frontier_layer': 'Frontier layer'
+            },
+            symbol='category',
+            size_max=10,  # Set maximum size for consistency
+            color_discrete_map=color_discrete_map,
+            symbol_map={
+                'Available': 'circle', 
+                'Available and Pareto-efficient': 'star', 
+                'Unavailable': 'circle', 
+                'Unavailable and Pareto-efficient': 'star'
+            },
+            render_mode=render_mode(len(plot_df))
+        )
+
+        # Set axis limits to ensure they start from 0
+        fig.update_xaxes(range=[0, filtered_df['price_per_bottle'].max()])
+        fig.update_yaxes(range=[0, filtered_df['cents_per_point'].max()])
+
+        # Update layout to move legend below the graph
+        fig.update_layout(
+            legend=dict(
+                orientation="h",  # Horizontal layout
+                yanchor="top",  # Anchor legend at the top of the extra space
+                y=-0.3,  # Position below the chart, adjust this to move it further down
+                xanchor="center",  # Center the legend horizontally
+                x=0.5  # Center the legend relative to the chart
+            ),
+            margin=dict(b=80)  # Add more margin to the bottom to accommodate the legend
+        )
+
+    return filtered_df, fig, len(plot_df)
+
+# retrieve the last updated timestamp, which is also the version of the data
 last_updated_url = st.secrets["LAST_UPDATED"]
+with profiler.stage('last_updated'):
+    last_updated = load_last_updated(last_updated_url)
 
-# read the text from the url
-last_updated = pd.read_csv(last_updated_url, header=None).iloc[0, 0]
-
-
-# observed that the way the bonus points works is that currentprice_bonusPoint reflects the number of points earnt per casevariant_1
-# and that currentprice_cashprice reflects the price of casevariant_1
-# let's create a new column which is the price per point
-df['price_per_point'] = df['currentprice_cashprice'] / df['currentprice_bonusPoint']
-# again as cents per point
-df['cents_per_point'] = df['price_per_point'] * 100
-# round to 2 decimal places
-df['cents_per_point'] = df['cents_per_point'].round(2)
-
-
-# calculate the price per bottle
-df['price_per_bottle'] = df['currentprice_cashprice']
-
-# remove any non wine with price per bottle less thatn $1
-df = df[df['price_per_bottle'] >= 1]
-
-
-
-# create a historical df containing only price_per_bottle and price_per_point
-# select the following columns and filter on eff_to = '9999-12-31'
-# 'wine_name', 'price_per_bottle', 'cents_per_point', 'rec_deleted_flag'
-df_hist = df[(df['eff_to'] == '9999-12-31')][['wine_name', 'price_per_bottle', 'cents_per_point', 'rec_deleted_flag', 'slug', 'wine_key']].copy()
+# Retrieve the DATA_LINK (and the optional CURRENT_DATA_LINK and HISTORY_DATA_LINK) from Streamlit Secrets
+file_url = st.secrets["DATA_LINK"]
+with profiler.stage('load_data'):
+    df_hist = load_data(file_url, st.secrets.get("CURRENT_DATA_LINK"), version=last_updated)
+with profiler.stage('load_history'):
+    history_index = load_history(file_url, st.secrets.get("HISTORY_DATA_LINK"), version=last_updated)
+with profiler.stage('search_index'):
+    search_index = load_search_index(df_hist, last_updated)
 
 # Add app title and last updated timestamp to the main page
 st.title("Qantas Wine Bonus Point Tracker")
 st.text(last_updated)
 
+# Changes between snapshots, from the optional CHANGES_DATA_LINK
+changes_url = st.secrets.get("CHANGES_DATA_LINK")
+if changes_url:
+    with profiler.stage('changes'):
+        df_changes = load_changes(changes_url, version=last_updated)
+        change_dates = sorted(df_changes['snapshot_date'].dt.date.unique(), reverse=True)
+
+    if change_dates:
+        with st.expander('What changed'):
+            change_date = st.selectbox('Changes on:', change_dates)
+            day_changes = df_changes[df_changes['snapshot_date'].dt.date == change_date]
+            day_changes = day_changes.sort_values(['change', 'cents_after', 'wine_name'])
+            counts = day_changes['change'].value_counts(sort=False)
+            st.caption(', '.join(f"{change}: {count:,}" for change, count in counts.items() if count))
+            st.dataframe(
+                day_changes[['change', 'wine_name', 'price_before', 'price_after', 'cents_before', 'cents_after']].rename(columns={
+                    'change': 'Change',
+                    'wine_name': 'Wine Name',
+                    'price_before': 'Price before ($)',
+                    'price_after': 'Price after ($)',
+                    'cents_before': 'Cents per Point before',
+                    'cents_after': 'Cents per Point after'
+                }),
+                hide_index=True
+            )
+
 # Sidebar form for user input
 with st.sidebar.form(key='filter_form'):
     # User input for filtering
     price_threshold = st.number_input('Max Price per Bottle (AUD)', min_value=0.0, value=100.0, step=5.0)
+
+    # The next best frontiers count as Pareto-efficient too: layer 2 is the frontier once layer 1 is taken out
+    frontier_layers = st.number_input('Frontier layers', min_value=1, max_value=max_frontier_layers, value=1, step=1)
     
     # Checkbox toggles for categories
     show_available = st.checkbox('Show Available', value=True)
@@ -64,41 +238,6 @@ with st.sidebar.form(key='filter_form'):
     # Submit button
     submit_button = st.form_submit_button(label='Apply Filters')
 
-# Filter the DataFrame based on user input
-filtered_df = df_hist[df_hist['price_per_bottle'] <= price_threshold].copy()
-
-# Function to find Pareto-efficient wines
-def is_pareto_efficient(costs):
-    is_efficient = np.ones(costs.shape[0], dtype=bool)
-    for i, cost in enumerate(costs):
-        if is_efficient[i]:
-            is_efficient[is_efficient] = np.any(costs[is_efficient] < cost, axis=1)
-            is_efficient[i] = True  # Keep the current point
-    return is_efficient
-
-# Apply the function to identify Pareto-efficient wines
-pareto_mask = is_pareto_efficient(filtered_df[['price_per_bottle', 'cents_per_point']].values)
-
-# Update the entire DataFrame for rows with matching price and point values
-filtered_df['is_pareto_efficient'] = False  # Default to not Pareto-efficient
-filtered_df.loc[pareto_mask, 'is_pareto_efficient'] = True
-
-# Ensure all wines with the same price_per_bottle and cents_per_point as a Pareto-efficient wine are marked
-for price, point in filtered_df.loc[filtered_df['is_pareto_efficient'], ['price_per_bottle', 'cents_per_point']].values:
-    filtered_df.loc[
-        (filtered_df['price_per_bottle'] == price) & (filtered_df['cents_per_point'] == point),
-        'is_pareto_efficient'
-    ] = True
-
-# Corrected categorisation based on availability and Pareto efficiency
-filtered_df['category'] = filtered_df.apply(
-    lambda row: 'Available and Pareto-efficient' if row['is_pareto_efficient'] and row['rec_deleted_flag'] == 0 else
-                'Available' if not row['is_pareto_efficient'] and row['rec_deleted_flag'] == 0 else
-                'Unavailable and Pareto-efficient' if row['is_pareto_efficient'] and row['rec_deleted_flag'] == 1 else
-                'Unavailable',
-    axis=1
-)
-
 # Filter based on the selected categories
 categories_to_show = []
 if show_available:
@@ -110,100 +249,76 @@ if show_unavailable:
 if show_unavailable_pareto:
     categories_to_show.append('Unavailable and Pareto-efficient')
 
-filtered_df = filtered_df[filtered_df['category'].isin(categories_to_show)]
-
-# Add random noise for plotting, but keep original values
-filtered_df['plot_price_per_bottle'] = filtered_df['price_per_bottle'] + np.random.uniform(-0.1, 0.1, size=filtered_df.shape[0])
-filtered_df['plot_cents_per_point'] = filtered_df['cents_per_point'] + np.random.uniform(-0.1, 0.1, size=filtered_df.shape[0])
-
-# Construct the full URL for each wine
-filtered_df['url'] = 'https://wine.qantas.com/p/' + filtered_df['slug'] + '/' + filtered_df['wine_key']
-
-# Define colours that work well on a dark background
-color_discrete_map = {
-    'Available': '#1f77b4',  # Bright blue
-    'Available and Pareto-efficient': '#ff7f0e',  # Orange
-    'Unavailable': '#d62728',  # Bright red
-    'Unavailable and Pareto-efficient': '#9467bd'  # Purple
-}
-
-# Scatter Plot using Plotly
-fig = px.scatter(
-    filtered_df, 
-    x='plot_price_per_bottle', 
-    y='plot_cents_per_point', 
-    hover_name='wine_name',
-    hover_data={'price_per_bottle': True, 'cents_per_point': True, 'plot_price_per_bottle': False, 'plot_cents_per_point': False},  # Show original values on hover
-    custom_data=['url'],  # Add URL to custom_data for click event
-    color='category',
-    labels={
-        'plot_price_per_bottle': 'Price per Bottle ($)', 
-        'plot_cents_per_point': 'Cents per Qantas Point',
-        'category': 'Category'
-    },
-    symbol='category',
-    size_max=10,  # Set maximum size for consistency
-    color_discrete_map=color_discrete_map,
-    symbol_map={
-        'Available': 'circle', 
-        'Available and Pareto-efficient': 'star', 
-        'Unavailable': 'circle', 
-        'Unavailable and Pareto-efficient': 'star'
-    }
-)
-
-# Set axis limits to ensure they start from 0
-fig.update_xaxes(range=[0, filtered_df['price_per_bottle'].max()])
-fig.update_yaxes(range=[0, filtered_df['cents_per_point'].max()])
-
-# Update layout to move legend below the graph
-fig.update_layout(
-    legend=dict(
-        orientation="h",  # Horizontal layout
-        yanchor="top",  # Anchor legend at the top of the extra space
-        y=-0.3,  # Position below the chart, adjust this to move it further down
-        xanchor="center",  # Center the legend horizontally
-        x=0.5  # Center the legend relative to the chart
-    ),
-    margin=dict(b=80)  # Add more margin to the bottom to accommodate the legend
-)
+# The filtered wines and their figure, worked out again only when the data or the form changed
+filter_stats.call()
+with profiler.stage('filter_wines'):
+    filtered_df, fig, plotted = filter_wines(df_hist, last_updated, price_threshold, tuple(categories_to_show), frontier_layers)
+profiler.frame('filtered_df', filtered_df)
 
 # Display the plot in Streamlit
-st.plotly_chart(fig)
+with profiler.stage('plot'):
+    st.plotly_chart(fig)
+    if plotted < len(filtered_df):
+        st.caption(f"Showing {plotted:,} of {len(filtered_df):,} wines: every Pareto-efficient wine, and a sample of the rest")
 
 # Search bar for filtering the table
 search_term = st.text_input("Search for a wine:")
+fuzzy_search = st.checkbox('Include close matches', value=False)
 
-# Filter the DataFrame based on the search term
-if search_term:
-    filtered_df = filtered_df[filtered_df['wine_name'].str.contains(search_term, case=False, na=False)]
+# Filter the DataFrame based on the search term, best cents per point first
+with profiler.stage('search'):
+    if search_term:
+        # rows of df_hist still shown after the filters above
+        allowed = np.zeros(len(df_hist), dtype=bool)
+        allowed[filtered_df.index] = True
+        filtered_df = filtered_df.loc[search_index.search(search_term, k=10, allowed=allowed, fuzzy=fuzzy_search)]
 
 # Limit the number of results to a maximum of 10
 filtered_df = filtered_df.head(10)
 
 # Display a table with wine name, price, and clickable URL
-filtered_df['View Wine'] = filtered_df['url'].apply(lambda x: f'<a href="{x}" target="_blank">View Wine</a>')
-
-# Create a dictionary to map original column names to prettier versions
-pretty_column_names = {
-    'wine_name': 'Wine Name',
-    'price_per_bottle': 'Price per Bottle ($)',
-    'cents_per_point': 'Cents per Qantas Point',
-    'category': 'Category',
-    'View Wine': 'Link to Wine'
-}
-
-# Select the relevant columns to display
-table_df = filtered_df[['wine_name', 'price_per_bottle', 'cents_per_point', 'category', 'View Wine']]
-
-# Rename columns for display purposes
-table_df = table_df.rename(columns=pretty_column_names)
-
-# Display the table with clickable links and prettified column names
-st.write(table_df.to_html(escape=False), unsafe_allow_html=True)
-
+with profiler.stage('table'):
+    filtered_df['View Wine'] = filtered_df['url'].apply(lambda x: f'<a href="{x}" target="_blank">View Wine</a>')
+
+    # Create a dictionary to map original column names to prettier versions
+    pretty_column_names = {
+        'wine_name': 'Wine Name',
+        'price_per_bottle': 'Price per Bottle ($)',
+        'cents_per_point': 'Cents per Qantas Point',
+        'category': 'Category',
+        'View Wine': 'Link to Wine'
+    }
 
+    # Select the relevant columns to display
+    table_df = filtered_df[['wine_name', 'price_per_bottle', 'cents_per_point', 'category', 'View Wine']]
 
+    # Rename columns for display purposes
+    table_df = table_df.rename(columns=pretty_column_names)
 
+    # Display the table with clickable links and prettified column names
+    st.write(table_df.to_html(escape=False), unsafe_allow_html=True)
 
+# Price history of one of the wines in the table
+wine_names = dict(zip(filtered_df['wine_key'], filtered_df['wine_name']))
+# Nothing is drawn until a wine is picked
+history_wine = st.selectbox(
+    'Price history for:', list(wine_names), format_func=wine_names.get, index=None, placeholder='Pick a wine from the table'
+)
 
+if history_wine is not None:
+    with profiler.stage('history_chart'):
+        history_fig, delisted = history_figure(history_index, last_updated, history_wine, date.today())
+        st.plotly_chart(history_fig)
+        if delisted is not None:
+            # the line stops where the wine was last seen
+            st.caption(f"No longer listed, the last price shown runs to {pd.Timestamp(delisted):%d %b %Y}")
+
+# Timings of this rerun and the memory of the main frames, when profiling is switched on
+if profiler.enabled:
+    profiler.frame('df_hist', df_hist)
+    profiler.frame('history', history_index.df)
+    with st.sidebar.expander('Profiling', expanded=True):
+        st.dataframe(profiler.stage_table(), hide_index=True)
+        st.dataframe(profiler.frame_table(), hide_index=True)
+        st.text(str(filter_stats))
+    profiler.log(version=last_updated, cache=filter_stats.as_dict())
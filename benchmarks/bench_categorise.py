@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+# Per-rerun cost of marking Pareto ties and categorising the wines in the app, before and after vectorising.
+# Run from the repository root: python benchmarks/bench_categorise.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pareto import prefix_frontier
+from categories import mark_pareto_ties, categorise
+
+
+def synthetic_view(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # prices and points on a coarse grid, so plenty of wines share a point on the frontier
+    df = pd.DataFrame({
+        'price_per_bottle': rng.choice(np.round(np.linspace(5, 200, 80), 2), n),
+        'cents_per_point': rng.choice(np.round(np.linspace(0.5, 40, 120), 2), n),
+        'rec_deleted_flag': (rng.random(n) < 0.25).astype('int64'),
+    })
+    df['is_pareto_efficient'] = prefix_frontier(df['price_per_bottle'].to_numpy(), df['cents_per_point'].to_numpy())
+    return df
+
+
+def before(filtered_df):
+    for price, point in filtered_df.loc[filtered_df['is_pareto_efficient'], ['price_per_bottle', 'cents_per_point']].values:
+        filtered_df.loc[
+            (filtered_df['price_per_bottle'] == price) & (filtered_df['cents_per_point'] == point),
+            'is_pareto_efficient'
+        ] = True
+    filtered_df['category'] = filtered_df.apply(
+        lambda row: 'Available and Pareto-efficient' if row['is_pareto_efficient'] and row['rec_deleted_flag'] == 0 else
+                    'Available' if not row['is_pareto_efficient'] and row['rec_deleted_flag'] == 0 else
+                    'Unavailable and Pareto-efficient' if row['is_pareto_efficient'] and row['rec_deleted_flag'] == 1 else
+                    'Unavailable',
+        axis=1
+    )
+    return filtered_df
+
+
+def after(filtered_df):
+    filtered_df['is_pareto_efficient'] = mark_pareto_ties(filtered_df, filtered_df['is_pareto_efficient'])
+    filtered_df['category'] = categorise(filtered_df['is_pareto_efficient'], filtered_df['rec_deleted_flag'])
+    return filtered_df
+
+
+def best_of(func, df, repeat):
+    times = []
+    for _ in range(repeat):
+        df_copy = df.copy()
+        start = time.perf_counter()
+        result = func(df_copy)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the tie marking and categorisation in the app')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for n in args.sizes:
+        df = synthetic_view(n)
+        before_ms, expected = best_of(before, df, args.repeat)
+        after_ms, result = best_of(after, df, args.repeat)
+        assert (expected['category'].to_numpy() == result['category'].to_numpy()).all()
+        print(f"{n:>8} {before_ms:>10.1f} {after_ms:>10.1f} {before_ms / after_ms:>7.0f}x")
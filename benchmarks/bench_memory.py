@@ -0,0 +1,78 @@
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import subprocess
+import pandas as pd
+
+# Memory of the app's data with the compact types in schema.py, against the same frames with the types they
+# had before (object strings for text and dates, 64-bit numbers).
+# st.cache_data hands every session (and every rerun) its own copy of the current view, so its size is paid
+# per session; the history is behind st.cache_resource and shared by all sessions.
+# Run from the repository root: python benchmarks/bench_memory.py [--scd scd/qantas_bonuspoints_true.csv]
+repo_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(repo_root)
+from schema import date_format, frame_memory, memory_report
+from synthetic import write_snapshot_history
+from current_view import build_current_view
+from price_history import build_history
+
+
+def as_before(df):
+    # the same frame with the types used before the compact schema
+    before = df.copy()
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, (pd.CategoricalDtype, pd.StringDtype)):
+            before[col] = df[col].astype(object)
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            before[col] = df[col].dt.strftime(date_format)
+        elif pd.api.types.is_extension_array_dtype(dtype) and dtype.kind == 'i':
+            before[col] = df[col].astype('Int64')
+        elif dtype.kind == 'i':
+            before[col] = df[col].astype('int64')
+        elif dtype.kind == 'f':
+            before[col] = df[col].astype('float64')
+    return before
+
+
+def synthetic_scd(workdir, wines, snapshots):
+    write_snapshot_history(os.path.join(workdir, 'archive'), wines, snapshots)
+    subprocess.run(
+        [sys.executable, os.path.join(repo_root, 'scrape_code', '05_scd.py'), '--full-rebuild'],
+        cwd=workdir, check=True, stdout=subprocess.DEVNULL
+    )
+    return os.path.join(workdir, 'scd', 'qantas_bonuspoints_true.csv')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Memory of the app's data before and after the compact types")
+    parser.add_argument('--scd', help='scd csv to measure, a synthetic one is built when not given')
+    parser.add_argument('--wines', type=int, default=20000)
+    parser.add_argument('--snapshots', type=int, default=60)
+    args = parser.parse_args()
+
+    workdir = None if args.scd else tempfile.mkdtemp(prefix='bench_memory_')
+    try:
+        scd_file = args.scd or synthetic_scd(workdir, args.wines, args.snapshots)
+        df_scd = pd.read_csv(scd_file)
+
+        current = build_current_view(df_scd)
+        history = build_history(df_scd)
+        report = memory_report({
+            'current view (per session)': (as_before(current), current),
+            'history (shared)': (as_before(history), history),
+        })
+        print(report.to_string(index=False))
+
+        print()
+        print('current view by column (MB)')
+        by_column = pd.DataFrame({
+            'before': frame_memory(as_before(current)) / 1e6,
+            'after': frame_memory(current) / 1e6,
+        })
+        print(by_column.round(3).to_string())
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+# Pareto frontier of two or more columns with pareto_efficient (the sweep for two columns, the sort-filter
+# skyline for more) against the reference is_pareto_efficient, and the cost of the first few frontier layers.
+# Run from the repository root: python benchmarks/bench_pareto.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pareto import is_pareto_efficient, pareto_efficient, pareto_layers
+
+
+def synthetic_costs(n, columns, correlation, seed=0):
+    # prices and cents per point on a grid like the catalogue's, and extra columns that follow the price:
+    # the more negative the correlation, the more wines are on the frontier
+    rng = np.random.default_rng(seed)
+    price = np.round(rng.lognormal(3.3, 0.6, n), 2)
+    costs = [price, np.round(rng.uniform(0.5, 40, n), 2)]
+    for _ in range(columns - 2):
+        noise = rng.standard_normal(n)
+        costs.append(np.round(correlation * (np.log(price) - 3.3) / 0.6 + np.sqrt(1 - correlation ** 2) * noise, 2))
+    return np.column_stack(costs)
+
+
+def best_of(func, costs, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(costs)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Pareto frontier and its layers')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--columns', type=int, nargs='+', default=[2, 3, 4])
+    parser.add_argument('--correlation', type=float, default=-0.5, help='of the extra columns with the price')
+    parser.add_argument('--layers', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-reference', type=int, default=100_000, help='sizes from which the reference is not timed')
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'columns':>7} {'frontier':>8} {'reference ms':>12} {'skyline ms':>10} {'speedup':>8} {'layers ms':>9}")
+    for columns in args.columns:
+        for n in args.sizes:
+            costs = synthetic_costs(n, columns, args.correlation)
+            skyline_ms, result = best_of(pareto_efficient, costs, args.repeat)
+            layers_ms, _ = best_of(lambda c: pareto_layers(c, args.layers), costs, args.repeat)
+            if n < args.skip_reference:
+                reference_ms, expected = best_of(is_pareto_efficient, costs, args.repeat)
+                assert (expected == result).all()
+                reference = f"{reference_ms:>12.1f} {skyline_ms:>10.1f} {reference_ms / skyline_ms:>7.0f}x"
+            else:
+                reference = f"{'-':>12} {skyline_ms:>10.1f} {'-':>8}"
+            print(f"{n:>8} {columns:>7} {result.sum():>8} {reference} {layers_ms:>9.1f}")
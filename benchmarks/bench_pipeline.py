@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Timings of the scrape-to-dashboard pipeline at several catalogue sizes, on synthetic data (see synthetic.py):
+# 02_combine_json.py, 03_create_csv.py and 05_scd.py run as scripts the way they are run for real, and the
+# app's data preparation (load, Pareto frontier, categorisation, search) runs in process.
+# Every run appends one line per scale to benchmarks/results.jsonl; --compare prints the change against the
+# previous run of the same scale.
+# Run from the repository root: python benchmarks/bench_pipeline.py --scales 1000x10,10000x30
+repo_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+scrape_code = os.path.join(repo_root, 'scrape_code')
+sys.path.append(repo_root)
+from synthetic import write_page_dumps, write_snapshot_history
+from current_view import build_current_view, read_scd_current
+from pareto import prefix_frontier, pareto_layers
+from categories import categorise
+from search_index import SearchIndex
+from scatter_plot import jitter, thin_points
+
+queries = ['shiraz', 'pinot noir', 'rose', 'barossa valley', '2019', 'champ', 'margaret river', 'penfolds grange']
+
+
+def best_of(repeat, f):
+    # fastest of repeat runs, in seconds
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_script(workdir, script, *args):
+    # the scripts use paths relative to the working directory ('temp', 'archive', 'scd')
+    subprocess.run([sys.executable, os.path.join(scrape_code, script), *args], cwd=workdir, check=True, stdout=subprocess.DEVNULL)
+
+
+def app_data_prep(scd_file, repeat):
+    # what the app does on a data load without the precomputed current view, and on every rerun
+    results = {}
+    holder = {}
+
+    def load():
+        df = build_current_view(read_scd_current(scd_file))
+        df['frontier_layer'] = pareto_layers(np.column_stack([df['price_per_bottle'].to_numpy(), df['cents_per_point'].to_numpy()]), 3)
+        holder['df'] = df
+
+    results['app_load'] = best_of(repeat, load)
+    df = holder['df']
+    prices, points = df['price_per_bottle'].to_numpy(), df['cents_per_point'].to_numpy()
+    results['app_pareto'] = best_of(repeat, lambda: prefix_frontier(prices, points))
+    results['app_frontier_layers'] = best_of(repeat, lambda: pareto_layers(np.column_stack([prices, points]), 3))
+
+    def rerun():
+        filtered_df = df[df['price_per_bottle'] <= 100.0].copy()
+        filtered_df['is_pareto_efficient'] = filtered_df['frontier_layer'].between(1, 1)
+        filtered_df['category'] = categorise(filtered_df['is_pareto_efficient'], filtered_df['rec_deleted_flag'])
+
+    results['app_categorise'] = best_of(repeat, rerun)
+
+    def scatter_points():
+        price_noise, cents_noise = jitter(df['wine_key'])
+        return df[thin_points(df, df['frontier_layer'] == 1)]
+
+    results['app_scatter_points'] = best_of(repeat, scatter_points)
+    results['app_search_index'] = best_of(repeat, lambda: holder.update(index=SearchIndex(df['wine_name'], df['cents_per_point'])))
+    index = holder['index']
+    results['app_search'] = best_of(repeat, lambda: [df.iloc[index.search(query, k=10)] for query in queries]) / len(queries)
+    results['current_rows'] = len(df)
+    return results
+
+
+def bench_scale(wines, snapshots, churn, repeat, seed):
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    try:
+        results = {}
+        final_wines = write_snapshot_history(os.path.join(workdir, 'archive'), wines, snapshots, churn, seed=seed)
+        write_page_dumps(os.path.join(workdir, 'temp'), final_wines)
+
+        results['02_combine_json'] = best_of(repeat, lambda: run_script(workdir, '02_combine_json.py'))
+        results['03_create_csv'] = best_of(repeat, lambda: run_script(workdir, '03_create_csv.py'))
+        results['03_create_csv_combined_json'] = best_of(repeat, lambda: run_script(workdir, '03_create_csv.py', '--combined-json'))
+        results['05_scd_full_rebuild'] = best_of(repeat, lambda: run_script(workdir, '05_scd.py', '--full-rebuild'))
+        # the state from the full rebuild is kept, so this only reads the snapshots of the last day again
+        results['05_scd_incremental'] = best_of(repeat, lambda: run_script(workdir, '05_scd.py'))
+
+        scd_file = os.path.join(workdir, 'scd', 'qantas_bonuspoints_true.csv')
+        results.update(app_data_prep(scd_file, repeat))
+        results['scd_rows'] = len(pd.read_csv(scd_file, usecols=['wine_key']))
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_root, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_results(output, scale):
+    if not os.path.exists(output):
+        return None
+    previous = None
+    with open(output, 'r', encoding='utf-8') as file:
+        for line in file:
+            record = json.loads(line)
+            if record['scale'] == scale:
+                previous = record
+    return previous
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the scrape-to-dashboard pipeline on synthetic data')
+    parser.add_argument('--scales', default='1000x10,10000x30', help="comma separated '<wines>x<snapshots>'")
+    parser.add_argument('--churn', type=float, default=0.05, help='share of wines changing price between snapshots')
+    parser.add_argument('--repeat', type=int, default=3, help='timings are the fastest of this many runs')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.jsonl'))
+    parser.add_argument('--compare', action='store_true', help='print the change against the previous run of each scale')
+    args = parser.parse_args()
+
+    for scale_text in args.scales.split(','):
+        wines, snapshots = (int(part) for part in scale_text.lower().split('x'))
+        scale = {'wines': wines, 'snapshots': snapshots, 'churn': args.churn, 'seed': args.seed}
+        previous = previous_results(args.output, scale) if args.compare else None
+
+        results = bench_scale(wines, snapshots, args.churn, args.repeat, args.seed)
+        record = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'scale': scale,
+            'results': results,
+        }
+        with open(args.output, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(record) + '\n')
+
+        print(f"{wines} wines x {snapshots} snapshots")
+        for name, value in results.items():
+            line = f"  {name:<28} {value:>12.4f}" if isinstance(value, float) else f"  {name:<28} {value:>12}"
+            if previous and isinstance(value, float) and previous['results'].get(name):
+                line += f"   {value / previous['results'][name]:6.2f}x vs {previous['commit'] or previous['timestamp']}"
+            print(line)
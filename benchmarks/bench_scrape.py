@@ -0,0 +1,61 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+# Pages per second of 01_extract_json.py without a browser, against the local fixture server (see
+# fixture_server.py), at several concurrencies and with and without a charset in the Content-Type header.
+# The names in the page dumps are checked against the catalogue's, which have accents ('Rosé', 'Moët').
+# Run from the repository root: python benchmarks/bench_scrape.py
+repo_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(repo_root, 'scrape_code'))
+from fixture_server import catalogue_pages, serve_in_thread
+from products import page_dump_files
+
+
+def dumped_names(json_folder):
+    names = []
+    for json_file in page_dump_files(json_folder):
+        with open(os.path.join(json_folder, json_file), 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        names.extend(p['name'] for p in data['props']['pageProps']['productSearchResults']['products'])
+    return names
+
+
+def scrape(base_url, concurrency):
+    # 01_extract_json.py the way it is run for real, in a folder of its own; seconds, and the names it saved
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, os.path.join(repo_root, 'scrape_code', '01_extract_json.py'), '--extractor', 'http',
+             '--base-url', base_url, '--concurrency', str(concurrency), '--retries', '0'],
+            cwd=workdir, check=True, stdout=subprocess.DEVNULL
+        )
+        return time.perf_counter() - start, dumped_names(os.path.join(workdir, 'temp'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the scrape without a browser against a local server')
+    parser.add_argument('--wines', type=int, default=2400, help='24 per page')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--charsets', nargs='+', default=['none', 'utf-8', 'iso-8859-1'], help="'none' leaves it out of the header")
+    parser.add_argument('--delay', type=float, default=0.02, help='seconds the server takes for every page')
+    parser.add_argument('--padding', type=int, default=100_000, help='bytes of filler markup before the JSON')
+    args = parser.parse_args()
+
+    pages, names = catalogue_pages(args.wines, padding=args.padding)
+    print(f"{len(pages)} pages of about {len(pages[0]) // 1000} kB, {args.delay * 1000:.0f} ms per page on the server")
+    print(f"{'charset':>10} {'concurrency':>11} {'seconds':>8} {'pages/s':>8} {'names':>6}")
+    for charset in args.charsets:
+        server, base_url = serve_in_thread(pages, charset=None if charset == 'none' else charset, delay=args.delay)
+        try:
+            for concurrency in args.concurrency:
+                seconds, scraped = scrape(base_url, concurrency)
+                ok = 'ok' if sorted(scraped) == sorted(names) else 'WRONG'
+                print(f"{charset:>10} {concurrency:>11} {seconds:>8.2f} {len(pages) / seconds:>8.1f} {ok:>6}")
+        finally:
+            server.shutdown()
+            server.server_close()
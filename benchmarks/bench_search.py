@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+import pandas as pd
+
+# Latency of the app's wine search: str.contains over the whole table vs the n-gram SearchIndex.
+# The default catalogue is about 100 times the size of the current one.
+# Run from the repository root: python benchmarks/bench_search.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from search_index import SearchIndex
+
+words = [
+    'Penfolds', 'Shiraz', 'Rosé', 'Cabernet', 'Sauvignon', 'Blanc', 'Pinot', 'Noir', 'Grange', 'Bin',
+    'Chardonnay', 'Yarra', 'Valley', 'Barossa', 'Merlot', 'Riesling', 'Moët', 'Champagne', 'Estate',
+    'Reserve', 'Margaret', 'River', 'Hunter', 'Semillon', 'Grenache', 'Tempranillo', 'Prosecco', 'Brut'
+]
+queries = ['shiraz', 'pinot noir', 'rose', 'barossa valley', 'bin 389', '2019', 'champ', 'margaret river caber', 'penfolds grange']
+
+
+def synthetic_catalogue(n, seed=0):
+    rng = random.Random(seed)
+    names = [f"{' '.join(rng.sample(words, 4))} {rng.randint(100, 999)} {rng.randint(1990, 2024)}" for _ in range(n)]
+    cents = np.round(np.random.default_rng(seed).uniform(0.5, 40, n), 2)
+    return pd.DataFrame({'wine_name': names, 'cents_per_point': cents})
+
+
+def str_contains(df, query):
+    return df[df['wine_name'].str.contains(query, case=False, na=False)].sort_values('cents_per_point').head(10)
+
+
+def percentiles(times):
+    return np.percentile(times, 50) * 1000, np.percentile(times, 95) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the wine search')
+    parser.add_argument('--wines', type=int, default=150_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    df = synthetic_catalogue(args.wines)
+
+    start = time.perf_counter()
+    index = SearchIndex(df['wine_name'], df['cents_per_point'])
+    print(f"{args.wines} wines, index built in {time.perf_counter() - start:.2f}s (once per dataset load)")
+
+    for name, search in [
+        ('str.contains', lambda q: str_contains(df, q)),
+        ('SearchIndex', lambda q: df.iloc[index.search(q, k=10)]),
+        ('SearchIndex fuzzy', lambda q: df.iloc[index.search(q, k=10, fuzzy=True)]),
+    ]:
+        times = []
+        for _ in range(args.repeat):
+            for query in queries:
+                start = time.perf_counter()
+                search(query)
+                times.append(time.perf_counter() - start)
+        p50, p95 = percentiles(times)
+        print(f"{name:<18} p50 {p50:8.2f} ms   p95 {p95:8.2f} ms")
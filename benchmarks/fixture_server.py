@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# A local stand-in for the product pages of wine.qantas.com, to benchmark and try out 01_extract_json.py offline.
+# Every page is HTML with the products of a synthetic catalogue (see synthetic.py) in script#__NEXT_DATA__, behind
+# some filler markup, and links the last page like the real one. Like the real site, the Content-Type doesn't
+# name a charset unless --charset is given; the pages are encoded in that charset, UTF-8 without one.
+# Run from the repository root: python benchmarks/fixture_server.py --wines 5000 --port 8000
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from synthetic import initial_wines, page_payload, page_size, product
+
+first_page_path = '/c/browse-products'
+page_path_prefix = '/c/browse-products/page-'
+
+
+def page_html(products, page_number, last_page, padding):
+    # '</' would end the script early, Next.js escapes it the same way
+    next_data = json.dumps({**page_payload(products), 'query': {'page': str(page_number)}}, ensure_ascii=False).replace('</', '<\\/')
+    return (
+        '<!DOCTYPE html><html><head><title>Browse products</title></head><body>'
+        + '<div class="product-tile"></div>' * (padding // 32)
+        + f'<a data-testid="page-last" href="{page_path_prefix}{last_page}?BonusPoints=1&amp;sort=featured">{last_page}</a>'
+        + f'<script id="__NEXT_DATA__" type="application/json">{next_data}</script>'
+        + '</body></html>'
+    )
+
+
+def catalogue_pages(n, seed=0, padding=100_000):
+    # the HTML of every page of a catalogue of about n wines, and the wines' names
+    wines, _ = initial_wines(n, seed)
+    products = [product(wine) for wine in wines.values()]
+    pages = [products[start:start + page_size] for start in range(0, len(products), page_size)] or [[]]
+    return [page_html(page, number, len(pages), padding) for number, page in enumerate(pages, start=1)], [wine['name'] for wine in wines.values()]
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    # keep-alive, so a pooled session reuses its connections
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        page_number = 1 if path == first_page_path else None
+        if path.startswith(page_path_prefix) and path[len(page_path_prefix):].isdigit():
+            page_number = int(path[len(page_path_prefix):])
+        if page_number is None or not 1 <= page_number <= len(self.server.pages):
+            self.send_error(404)
+            return
+
+        time.sleep(self.server.delay)
+        body = self.server.pages[page_number - 1].encode(self.server.charset or 'utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html' + (f'; charset={self.server.charset}' if self.server.charset else ''))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, pages, charset=None, delay=0.0):
+        super().__init__(address, PageHandler)
+        self.pages = pages
+        self.charset = charset
+        self.delay = delay
+
+
+def serve_in_thread(pages, charset=None, delay=0.0, port=0):
+    # the server, running in a background thread, and the base url to scrape
+    server = FixtureServer(('127.0.0.1', port), pages, charset=charset, delay=delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve synthetic product pages like wine.qantas.com')
+    parser.add_argument('--wines', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--charset', help="named in the Content-Type header, e.g. 'utf-8' or 'iso-8859-1'")
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds before every response')
+    parser.add_argument('--padding', type=int, default=100_000, help='bytes of filler markup before the JSON')
+    args = parser.parse_args()
+
+    pages, _ = catalogue_pages(args.wines, args.seed, args.padding)
+    server = FixtureServer(('127.0.0.1', args.port), pages, charset=args.charset, delay=args.delay)
+    print(f"Serving {len(pages)} pages on http://127.0.0.1:{args.port}, "
+          f"e.g. python scrape_code/01_extract_json.py --extractor http --base-url http://127.0.0.1:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# Synthetic scrape data for the benchmarks, all generated offline: __NEXT_DATA__ page dumps like the ones
+# 01_extract_json.py saves, and a history of archived snapshots like the ones 04_process.py leaves behind.
+# churn is the share of wines whose price changes between two snapshots; a fifth of that many wines are
+# delisted, and as many new ones listed.
+# Run from the repository root: python benchmarks/synthetic.py <folder> --wines 5000 --snapshots 30
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scrape_code'))
+from products import write_products
+from snapshot_store import read_snapshot_csv, write_snapshot_parquet
+
+words = [
+    'Penfolds', 'Shiraz', 'Rosé', 'Cabernet', 'Sauvignon', 'Blanc', 'Pinot', 'Noir', 'Grange', 'Bin',
+    'Chardonnay', 'Yarra', 'Valley', 'Barossa', 'Merlot', 'Riesling', 'Moët', 'Champagne', 'Estate',
+    'Reserve', 'Margaret', 'River', 'Hunter', 'Semillon', 'Grenache', 'Tempranillo', 'Prosecco', 'Brut'
+]
+prices = [9.99, 12.5, 15, 17.99, 19.99, 22, 25, 29.99, 35, 42, 49.99, 60, 79.99, 99, 120, 150, 199]
+points = [100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000]
+
+page_size = 24
+first_snapshot = datetime(2024, 8, 18, 9, 0, 0)
+
+
+def new_wine(i, rng):
+    key = f'W{i:07d}'
+    return {
+        'name': f"{' '.join(rng.sample(words, 3))} {rng.randint(1990, 2024)}",
+        'key': key,
+        'slug': f'wine-{i}' + ('-subscription' if rng.random() < 0.03 else ''),
+        'case_variants': [f'{key}-{size}' for size in rng.sample([1, 3, 6, 12], rng.randint(0, 3))],
+        'price': rng.choice(prices),
+        'points': rng.choice(points),
+    }
+
+
+def initial_wines(n, seed=0):
+    rng = random.Random(seed)
+    return {wine['key']: wine for wine in (new_wine(i, rng) for i in range(n))}, rng
+
+
+def evolve(wines, rng, churn):
+    # price and points changes, delistings and new listings between two snapshots
+    for wine in wines.values():
+        if rng.random() < churn:
+            wine['price'] = rng.choice(prices)
+        if rng.random() < churn / 2:
+            wine['points'] = rng.choice(points)
+    changes = int(len(wines) * churn / 5)
+    for key in rng.sample(sorted(wines), min(changes, len(wines))):
+        del wines[key]
+    start = max(int(key[1:]) for key in wines) + 1 if wines else 0
+    for i in range(start, start + changes):
+        wines[f'W{i:07d}'] = new_wine(i, rng)
+
+
+def product(wine):
+    # the parts of a __NEXT_DATA__ product that extract_info reads
+    attributes = {'caseVariants': [{'key': key} for key in wine['case_variants']]} if wine['case_variants'] else {'displayQuantity': '1'}
+    return {
+        'name': wine['name'],
+        'key': wine['key'],
+        'slug': wine['slug'],
+        'variants': [{
+            'allAttributes': attributes,
+            'currentPrice': {
+                'cashPrice': {'amount': wine['price']},
+                'bonusPoint': wine['points'],
+                'validFrom': '2024-08-01T00:00:00Z',
+                'validUntil': '2025-08-01T00:00:00Z',
+            },
+        }],
+    }
+
+
+def page_payload(products):
+    return {'props': {'pageProps': {'productSearchResults': {'products': products}}}, 'page': '/c/[...slug]'}
+
+
+def write_page_dumps(folder, wines):
+    # json_dump_page_{page_number}.json files, saved the way 01_extract_json.py saves them
+    os.makedirs(folder, exist_ok=True)
+    products = [product(wine) for wine in wines.values()]
+    for page_number, start in enumerate(range(0, len(products), page_size), start=1):
+        with open(os.path.join(folder, f'json_dump_page_{page_number}.json'), 'w', encoding='utf-8') as json_file:
+            json.dump(page_payload(products[start:start + page_size]), json_file, indent=4)
+    return (len(products) + page_size - 1) // page_size
+
+
+def write_snapshot_history(archive_folder, n, snapshots, churn=0.05, per_day=3, seed=0, parquet=True):
+    # archive/csv/{timestamp}_products_data.csv files, plus the parquet copies 04_process.py writes next to them.
+    # Returns the wines as of the last snapshot
+    wines, rng = initial_wines(n, seed)
+    csv_folder = os.path.join(archive_folder, 'csv')
+    parquet_folder = os.path.join(archive_folder, 'parquet')
+    os.makedirs(csv_folder, exist_ok=True)
+    if parquet:
+        os.makedirs(parquet_folder, exist_ok=True)
+
+    for s in range(snapshots):
+        if s:
+            evolve(wines, rng, churn)
+        snapshot_time = first_snapshot + timedelta(days=s // per_day, hours=4 * (s % per_day), seconds=s)
+        timestamp = snapshot_time.strftime('%Y%m%d_%H%M%S')
+        csv_path = os.path.join(csv_folder, f'{timestamp}_products_data.csv')
+        write_products((product(wine) for wine in wines.values()), csv_path=csv_path)
+        if parquet:
+            write_snapshot_parquet(
+                read_snapshot_csv(csv_path, snapshot_time), os.path.join(parquet_folder, f'{timestamp}_products_data.parquet')
+            )
+    return wines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write synthetic page dumps and archived snapshots')
+    parser.add_argument('folder', help="written like the scrape_code folder, with 'temp' and 'archive' in it")
+    parser.add_argument('--wines', type=int, default=5000)
+    parser.add_argument('--snapshots', type=int, default=30)
+    parser.add_argument('--churn', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    wines = write_snapshot_history(os.path.join(args.folder, 'archive'), args.wines, args.snapshots, args.churn, seed=args.seed)
+    pages = write_page_dumps(os.path.join(args.folder, 'temp'), wines)
+    print(f"Wrote {args.snapshots} snapshots of about {args.wines} wines and {pages} page dumps to {args.folder}")
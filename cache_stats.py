@@ -0,0 +1,33 @@
+import threading
+
+# Hit and miss counters of one of the app's cached functions. Streamlit doesn't say whether a call was served
+# from its cache, so every call is counted before the cached function, and the body of the function counts the
+# misses: the rest of the calls were hits. One instance is shared by all sessions, hence the lock.
+
+
+class CacheStats:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def call(self):
+        with self.lock:
+            self.calls += 1
+
+    def miss(self):
+        with self.lock:
+            self.misses += 1
+
+    @property
+    def hits(self):
+        return self.calls - self.misses
+
+    def as_dict(self):
+        with self.lock:
+            return {'cache': self.name, 'calls': self.calls, 'hits': self.calls - self.misses, 'misses': self.misses}
+
+    def __str__(self):
+        stats = self.as_dict()
+        return f"{stats['cache']}: {stats['hits']} hits, {stats['misses']} misses"
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+# Categorisation of the wines shown in the app, based on availability and Pareto efficiency
+
+available = 'Available'
+available_pareto = 'Available and Pareto-efficient'
+unavailable = 'Unavailable'
+unavailable_pareto = 'Unavailable and Pareto-efficient'
+
+
+def mark_pareto_ties(df, is_efficient):
+    # Ensure all wines with the same price_per_bottle and cents_per_point as a Pareto-efficient wine are marked
+    pairs = pd.MultiIndex.from_arrays([df['price_per_bottle'], df['cents_per_point']])
+    return pairs.isin(pairs[np.asarray(is_efficient, dtype=bool)])
+
+
+def categorise(is_efficient, rec_deleted_flag):
+    is_efficient = np.asarray(is_efficient, dtype=bool)
+    is_available = np.asarray(rec_deleted_flag) == 0
+    is_unavailable = np.asarray(rec_deleted_flag) == 1
+    return np.select(
+        [is_efficient & is_available, is_available, is_efficient & is_unavailable],
+        [available_pareto, available, unavailable_pareto],
+        default=unavailable
+    )
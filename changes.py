@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+from schema import date_dtype, to_dates
+from pareto import pareto_layers
+
+# What changed from one snapshot date to the next: wines newly listed or delisted, cheaper, with better cents per
+# point, or newly Pareto-efficient. 05_scd.py works it out from the daily records it builds the scd table from, one
+# per wine and snapshot date, and writes it next to the scd file, so the app can show it without going through the
+# whole history. An incremental build only works out the new snapshot dates, against the listing of the date before
+# them kept in its state, so it gives the same changes as a full rebuild.
+# Wines are left out like in the current view: subscriptions and prices under $1. The Pareto frontier of a date is
+# the one of the wines listed that day, so unlike in the app delisted wines aren't part of it.
+
+new_listing = 'New listing'
+delisted = 'Delisted'
+price_drop = 'Price drop'
+better_cents_per_point = 'Better cents per point'
+newly_pareto = 'Newly Pareto-efficient'
+change_types = [new_listing, delisted, price_drop, better_cents_per_point, newly_pareto]
+
+changes_dtypes = {
+    'snapshot_date': date_dtype,
+    'change': pd.CategoricalDtype(change_types, ordered=True),
+    'wine_key': 'string[pyarrow]',
+    'wine_name': 'string[pyarrow]',
+    'price_before': 'float64',
+    'price_after': 'float64',
+    'cents_before': 'float64',
+    'cents_after': 'float64',
+}
+
+
+listing_columns = ['snapshot_date', 'wine_key', 'wine_name', 'slug', 'currentprice_cashprice', 'currentprice_bonusPoint']
+
+
+def snapshot_changes(daily, before=None):
+    # daily: the listing_columns of every wine on every snapshot date, one row per wine and date.
+    # before: the same for the snapshot date before the first one of daily. Without it the first date has nothing
+    # to compare with and gets no changes. One row per wine and change for every other date of daily
+    df = pd.concat([f[listing_columns] for f in (before, daily) if f is not None], ignore_index=True)
+    dates = np.unique(to_dates(df['snapshot_date']).to_numpy())
+    df = df[~df['slug'].str.contains('subscription', case=False, na=False) & (df['currentprice_cashprice'] >= 1)]
+
+    date_ids = np.searchsorted(dates, to_dates(df['snapshot_date']).to_numpy())
+    keys = df['wine_key'].astype(str).to_numpy()
+    names = df['wine_name'].to_numpy(dtype=object)
+    prices = df['currentprice_cashprice'].to_numpy(dtype='float64', na_value=np.nan)
+    points = df['currentprice_bonusPoint'].to_numpy(dtype='float64', na_value=np.nan)
+    cents = np.round(prices / points * 100, 2)
+
+    # the Pareto frontier of every date
+    is_efficient = np.zeros(len(df), dtype=bool)
+    by_date = np.argsort(date_ids, kind='stable')
+    for rows in np.split(by_date, np.flatnonzero(np.diff(date_ids[by_date])) + 1):
+        is_efficient[rows] = pareto_layers(np.column_stack([prices[rows], cents[rows]]), 1) == 1
+
+    # every wine's rows in date order: a row follows the one before it when that is the same wine on the date before
+    order = np.lexsort((date_ids, keys))
+    same_wine = keys[order[1:]] == keys[order[:-1]]
+    follows = same_wine & (date_ids[order[1:]] == date_ids[order[:-1]] + 1)
+    previous = np.full(len(df), -1, dtype=np.int64)
+    previous[order[1:][follows]] = order[:-1][follows]
+    is_followed = np.zeros(len(df), dtype=bool)
+    is_followed[order[:-1][follows]] = True
+
+    # after: the rows of the dates that get changes, with the row of the date before when the wine was listed then
+    after = np.flatnonzero(date_ids > 0)
+    was_listed = previous[after] >= 0
+    before_rows = previous[after[was_listed]]
+    both = after[was_listed]
+    # the wines delisted on the date after their row
+    gone = np.flatnonzero(~is_followed & (date_ids < len(dates) - 1))
+
+    nan = np.full(len(df), np.nan)
+    before_prices, before_cents = nan.copy(), nan.copy()
+    before_prices[both], before_cents[both] = prices[before_rows], cents[before_rows]
+    before_efficient = np.zeros(len(df), dtype=bool)
+    before_efficient[both] = is_efficient[before_rows]
+
+    def frame(change, rows, snapshot_dates, price_before, price_after, cents_before, cents_after):
+        return pd.DataFrame({
+            'snapshot_date': snapshot_dates,
+            'change': change,
+            'wine_key': keys[rows],
+            'wine_name': names[rows],
+            'price_before': price_before,
+            'price_after': price_after,
+            'cents_before': cents_before,
+            'cents_after': cents_after,
+        })
+
+    def listed(change, rows):
+        return frame(change, rows, dates[date_ids[rows]], before_prices[rows], prices[rows], before_cents[rows], cents[rows])
+
+    changes = [
+        listed(new_listing, after[~was_listed]),
+        frame(delisted, gone, dates[date_ids[gone] + 1], prices[gone], np.nan, cents[gone], np.nan),
+        listed(price_drop, both[prices[both] < before_prices[both]]),
+        listed(better_cents_per_point, both[cents[both] < before_cents[both]]),
+        listed(newly_pareto, after[is_efficient[after] & ~before_efficient[after]]),
+    ]
+    df_changes = pd.concat(changes, ignore_index=True).astype(changes_dtypes)
+    return df_changes.sort_values(['snapshot_date', 'change', 'wine_key'], kind='stable', ignore_index=True)
+
+
+def update_changes(existing, changes, from_date):
+    # the changes before from_date stay as they were, the ones from it on are the ones just worked out
+    if existing is None or from_date is None:
+        return changes
+    kept = existing[existing['snapshot_date'] < to_dates([from_date]).iloc[0]]
+    return pd.concat([kept, changes], ignore_index=True).astype(changes_dtypes)
+
+
+def write_changes(df, path):
+    df.to_parquet(path, index=False)
+
+
+def read_changes(path):
+    return pd.read_parquet(path, columns=list(changes_dtypes)).astype(changes_dtypes)
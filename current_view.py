@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+from schema import open_date, scd_column_types, to_dates
+
+# The part of the scd table the app actually shows: the current version of every wine, with the
+# derived price columns and the wine URL. 05_scd.py writes it next to the scd file, so the app
+# doesn't have to repeat these transforms for every session.
+
+# the text columns are different on every row, so rather than categoricals they are arrow strings:
+# one buffer per column instead of a Python object per value
+current_view_dtypes = {
+    'wine_key': 'string[pyarrow]',
+    'wine_name': 'string[pyarrow]',
+    'slug': 'string[pyarrow]',
+    'price_per_bottle': 'float64',
+    'price_per_point': 'float32',  # not shown, only cents_per_point is
+    'cents_per_point': 'float64',
+    'rec_deleted_flag': 'int8',
+    'url': 'string[pyarrow]',
+}
+
+# the scd columns build_current_view reads
+scd_dtypes = scd_column_types([
+    'wine_key', 'wine_name', 'slug', 'eff_to', 'rec_deleted_flag', 'currentprice_cashprice', 'currentprice_bonusPoint'
+])
+scd_chunk_size = 100_000
+
+
+def read_scd_current(path):
+    # Only the columns above, and only the current versions: the csv can't filter rows as it is read, so it
+    # is parsed in chunks and the older versions are dropped from each chunk before the next one is read
+    open_eff_to = np.datetime_as_string(open_date, unit='D')
+    chunks = pd.read_csv(path, usecols=list(scd_dtypes), dtype=scd_dtypes, chunksize=scd_chunk_size)
+    current = [chunk[chunk['eff_to'] == open_eff_to] for chunk in chunks]
+    return pd.concat(current, ignore_index=True) if current else pd.DataFrame(columns=list(scd_dtypes)).astype(scd_dtypes)
+
+
+def build_current_view(df):
+    # Remove any slug which contains the word 'subscription', and keep the current version of each wine
+    df = df[~df['slug'].str.contains('subscription', case=False, na=False)]
+    # eff_to may still be text, when df was read from the scd csv
+    df = df[(to_dates(df['eff_to']) == open_date).to_numpy()].copy()
+
+    # observed that the way the bonus points works is that currentprice_bonusPoint reflects the number of points earnt per casevariant_1
+    # and that currentprice_cashprice reflects the price of casevariant_1
+    # let's create a new column which is the price per point
+    df['price_per_point'] = df['currentprice_cashprice'] / df['currentprice_bonusPoint']
+    # again as cents per point, rounded to 2 decimal places
+    df['cents_per_point'] = (df['price_per_point'] * 100).round(2)
+
+    # calculate the price per bottle
+    df['price_per_bottle'] = df['currentprice_cashprice']
+
+    # remove any non wine with price per bottle less thatn $1
+    df = df[df['price_per_bottle'] >= 1]
+
+    # Construct the full URL for each wine
+    df['url'] = 'https://wine.qantas.com/p/' + df['slug'] + '/' + df['wine_key']
+
+    return df[list(current_view_dtypes)].astype(current_view_dtypes).reset_index(drop=True)
+
+
+def write_current_view(df, path):
+    df.to_parquet(path, index=False)
+
+
+def read_current_view(path):
+    # files written before the current types are converted on the way in
+    return pd.read_parquet(path, columns=list(current_view_dtypes)).astype(current_view_dtypes)
@@ -0,0 +1,150 @@
+import numpy as np
+
+# Pareto frontier of (price_per_bottle, cents_per_point), lower is better for both, and of any other set of
+# columns where lower is better (negate a column where higher is better).
+
+# most points compared against each other at the front of pareto_efficient_nd, and most comparisons in one go
+block_size = 1024
+comparisons = 4_000_000
+
+
+# Function to find Pareto-efficient wines. O(n^2) in the worst case, kept as the reference for pareto_efficient_2d
+def is_pareto_efficient(costs):
+    is_efficient = np.ones(costs.shape[0], dtype=bool)
+    for i, cost in enumerate(costs):
+        if is_efficient[i]:
+            is_efficient[is_efficient] = np.any(costs[is_efficient] < cost, axis=1)
+            is_efficient[i] = True  # Keep the current point
+    return is_efficient
+
+
+def pareto_efficient_2d(costs):
+    # Same result as is_pareto_efficient for two columns, with one sort and one sweep.
+    # Sorted by the first column (then the second, then position), a point is efficient when its second
+    # column is lower than every point before it. Of identical points only the first one is marked,
+    # like is_pareto_efficient does. Rows with a missing value are never efficient.
+    costs = np.asarray(costs, dtype='float64')
+    is_efficient = np.zeros(costs.shape[0], dtype=bool)
+
+    valid = np.flatnonzero(~np.isnan(costs).any(axis=1))
+    if valid.size == 0:
+        return is_efficient
+
+    x, y = costs[valid, 0], costs[valid, 1]
+    order = np.lexsort((valid, y, x))
+    y_sorted = y[order]
+
+    # the lowest second column of all the points sorted before each point
+    best_before = np.empty_like(y_sorted)
+    best_before[0] = np.inf
+    np.minimum.accumulate(y_sorted[:-1], out=best_before[1:])
+
+    efficient_sorted = y_sorted < best_before
+    efficient_sorted[0] = True  # nothing comes before the first point, even when its second column is inf
+
+    is_efficient[valid[order]] = efficient_sorted
+    return is_efficient
+
+
+def prefix_frontier(prices, points):
+    # A point's efficiency only depends on the points sorted before it, which are all at least as cheap.
+    # So filtering on price <= threshold keeps exactly the efficient points at or below the threshold,
+    # and this one mask serves every threshold: frontier for a threshold = mask[prices <= threshold]
+    return pareto_efficient_2d(np.column_stack([prices, points]))
+
+
+def dominated_by(points, by):
+    # dominated[i]: some row of by is at least as low as row i of points in every column
+    dominated = by[None, :, 0] <= points[:, None, 0]
+    for column in range(1, points.shape[1]):
+        dominated &= by[None, :, column] <= points[:, None, column]
+    return dominated.any(axis=1)
+
+
+def pareto_efficient_nd(costs):
+    # Same result as is_pareto_efficient for any number of columns, with a sort-filter skyline.
+    # Sorted by the sum of the columns (then the columns, then position), every point that is at least as low
+    # in every column comes before a point. So the first of the points left is always efficient, and so is every
+    # point at the front that isn't beaten by one before it. The efficient points at the front then remove the
+    # points they beat from the rest, and the front grows as the points left get fewer.
+    costs = np.asarray(costs, dtype='float64')
+    is_efficient = np.zeros(costs.shape[0], dtype=bool)
+
+    valid = np.flatnonzero(~np.isnan(costs).any(axis=1))
+    if valid.size == 0:
+        return is_efficient
+
+    points = costs[valid]
+    order = np.lexsort((valid, *points.T[::-1], points.sum(axis=1)))
+    points = points[order]
+
+    efficient_sorted = np.zeros(len(points), dtype=bool)
+    remaining = np.arange(len(points))
+    front_size = 8
+    while remaining.size:
+        front, remaining = remaining[:front_size], remaining[front_size:]
+        front_points = points[front]
+        # dominated[i, j]: point j of the front is at least as low as point i in every column
+        dominated = front_points[None, :, 0] <= front_points[:, None, 0]
+        for column in range(1, points.shape[1]):
+            dominated &= front_points[None, :, column] <= front_points[:, None, column]
+        efficient = ~np.tril(dominated, k=-1).any(axis=1)
+        efficient_sorted[front[efficient]] = True
+
+        if remaining.size:
+            efficient_points = front_points[efficient]
+            keep = np.empty(remaining.size, dtype=bool)
+            step = max(1, comparisons // len(efficient_points))
+            for start in range(0, remaining.size, step):
+                keep[start:start + step] = ~dominated_by(points[remaining[start:start + step]], efficient_points)
+            remaining = remaining[keep]
+        front_size = min(front_size * 2, block_size)
+
+    is_efficient[valid[order]] = efficient_sorted
+    return is_efficient
+
+
+def pareto_efficient(costs):
+    # is_pareto_efficient for any number of columns: the sweep for one or two, the skyline for more
+    costs = np.asarray(costs, dtype='float64')
+    if costs.ndim != 2 or costs.shape[1] == 0:
+        raise ValueError(f"Expected an (n, columns) array of costs, got shape {costs.shape}")
+    if costs.shape[1] == 1:
+        return pareto_efficient_2d(np.column_stack([costs, np.zeros(costs.shape[0])]))
+    if costs.shape[1] == 2:
+        return pareto_efficient_2d(costs)
+    return pareto_efficient_nd(costs)
+
+
+def pareto_layers(costs, max_layers=None):
+    # Frontier layer of every row: 1 for the Pareto-efficient rows, 2 for the rows that are efficient once the
+    # first layer is taken out, and so on. Identical rows share a layer, unlike in is_pareto_efficient, and rows
+    # with a missing value or past max_layers get 0.
+    # Like the frontier, a row's layer only depends on the rows at least as low in every column, so with price as
+    # one of the columns the layers under a price threshold are layers[prices <= threshold]
+    costs = np.asarray(costs, dtype='float64')
+    layers = np.zeros(costs.shape[0], dtype=np.int32)
+
+    valid = np.flatnonzero(~np.isnan(costs).any(axis=1))
+    if valid.size == 0:
+        return layers
+
+    # the distinct rows, and which of them every row is
+    rows = costs[valid]
+    order = np.lexsort(rows.T[::-1])
+    first = np.r_[True, (rows[order[1:]] != rows[order[:-1]]).any(axis=1)]
+    unique = rows[order[first]]
+    inverse = np.empty(len(rows), dtype=np.int64)
+    inverse[order] = np.cumsum(first) - 1
+
+    unique_layers = np.zeros(len(unique), dtype=np.int32)
+    remaining = np.arange(len(unique))
+    layer = 0
+    while remaining.size and (max_layers is None or layer < max_layers):
+        layer += 1
+        efficient = pareto_efficient(unique[remaining])
+        unique_layers[remaining[efficient]] = layer
+        remaining = remaining[~efficient]
+
+    layers[valid] = unique_layers[inverse]
+    return layers
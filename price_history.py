@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+from schema import date_dtype, open_date, scd_column_types
+
+# Price and points history of every wine, taken from all the versions in the scd table.
+# The rows are sorted by wine_key, so the history of one wine is a contiguous range of rows and
+# HistoryIndex can hand it out with a slice instead of scanning the whole table.
+# The scd table leaves the latest version of a delisted wine open ('9999-12-31', with rec_deleted_flag 1). With the
+# state of 05_scd.py the history ends it on the last date the wine was seen instead, so its line stops there.
+
+history_dtypes = {
+    'wine_key': 'category',  # repeated for every version of a wine
+    'eff_from': date_dtype,
+    'eff_to': date_dtype,
+    'rec_deleted_flag': 'int8',
+    'price_per_bottle': 'float64',
+    'cents_per_point': 'float64',
+}
+
+# the scd columns build_history reads
+scd_dtypes = scd_column_types([
+    'wine_key', 'eff_from', 'eff_to', 'rec_deleted_flag', 'currentprice_cashprice', 'currentprice_bonusPoint'
+])
+
+
+def read_scd_history(path):
+    # every version, but only the columns above
+    return pd.read_csv(path, usecols=list(scd_dtypes), dtype=scd_dtypes)
+
+
+def build_history(df, df_state=None):
+    df = df.copy()
+    if df_state is not None:
+        # the last date every version was seen, for the delisted wines
+        last_seen = df[['wine_key', 'record_checksum']].merge(
+            df_state[['wine_key', 'record_checksum', 'eff_to']], on=['wine_key', 'record_checksum'], how='left'
+        )['eff_to'].to_numpy()
+        deleted = (df['rec_deleted_flag'] == 1).to_numpy() & ~pd.isna(last_seen)
+        df.loc[deleted, 'eff_to'] = last_seen[deleted]
+    df['price_per_bottle'] = df['currentprice_cashprice']
+    df['cents_per_point'] = (df['currentprice_cashprice'] / df['currentprice_bonusPoint'] * 100).round(2)
+    df = df.sort_values(['wine_key', 'eff_from'], kind='stable')
+    return df[list(history_dtypes)].astype(history_dtypes).reset_index(drop=True)
+
+
+def write_history(df, path):
+    df.to_parquet(path, index=False)
+
+
+def read_history(path):
+    # files written before the current types are converted on the way in
+    return pd.read_parquet(path, columns=list(history_dtypes)).astype(history_dtypes)
+
+
+class HistoryIndex:
+    def __init__(self, df):
+        self.df = df
+        # start of every run of rows with the same wine_key
+        keys = df['wine_key'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=int)
+        stops = np.r_[starts[1:], len(keys)]
+        self.offsets = dict(zip(keys[starts], zip(starts.tolist(), stops.tolist())))
+
+    def lookup(self, wine_key):
+        start, stop = self.offsets.get(wine_key, (0, 0))
+        return self.df.iloc[start:stop]
+
+
+def delisted_since(df_wine):
+    # None while the wine is listed. For a delisted wine the last date it was seen, or the start of its latest
+    # version when the history doesn't say (built from the scd table alone)
+    if df_wine.empty or df_wine['rec_deleted_flag'].iloc[-1] != 1:
+        return None
+    latest = df_wine.iloc[-1]
+    return latest['eff_from'] if latest['eff_to'] == open_date else latest['eff_to']
+
+
+def history_steps(df_wine, today):
+    # one point per version at its eff_from, plus one at the end of the latest version so its step is drawn.
+    # open versions ('9999-12-31') run until today, unless the wine was delisted
+    if df_wine.empty:
+        return pd.DataFrame(columns=['date', 'measure', 'value'])
+    end = delisted_since(df_wine)
+    if end is None:
+        end = min(df_wine['eff_to'].max(), today)
+    steps = pd.concat([df_wine, df_wine.iloc[[-1]].assign(eff_from=end)], ignore_index=True)
+    steps = steps.rename(columns={
+        'eff_from': 'date', 'price_per_bottle': 'Price per Bottle ($)', 'cents_per_point': 'Cents per Qantas Point'
+    })
+    return steps.melt(
+        id_vars='date', value_vars=['Price per Bottle ($)', 'Cents per Qantas Point'], var_name='measure', value_name='value'
+    )
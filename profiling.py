@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import logging
+from contextlib import contextmanager
+import pandas as pd
+from schema import frame_memory
+
+# Timings of the app's stages for one rerun, and the memory of its main frames. Off unless the PROFILE secret
+# or the QANTASWINE_PROFILE environment variable is set (the variable wins), so the timers cost nothing in
+# normal use. When on, the app shows them in a sidebar panel and logs one JSON line per rerun.
+# Stages can be nested: a stage started inside another is named 'outer/inner'. Stages inside a cached
+# function only show up on the reruns where the cache missed.
+
+env_variable = 'QANTASWINE_PROFILE'
+
+logger = logging.getLogger('qantaswine.profile')
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def profiling_enabled(secret=None):
+    value = os.environ.get(env_variable, secret)
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class Profiler:
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.frames = {}
+        self.current = []
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        self.current.append(name)
+        path = '/'.join(self.current)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[path] = self.stages.get(path, 0.0) + (time.perf_counter() - start) * 1000
+            self.current.pop()
+
+    def frame(self, name, df):
+        if self.enabled:
+            self.frames[name] = {'rows': len(df), 'mb': round(frame_memory(df).sum() / 1e6, 3)}
+
+    def stage_table(self):
+        return pd.DataFrame({'stage': list(self.stages), 'ms': [round(ms, 1) for ms in self.stages.values()]})
+
+    def frame_table(self):
+        return pd.DataFrame([{'frame': name, **frame} for name, frame in self.frames.items()])
+
+    def record(self, **fields):
+        return {
+            'event': 'rerun',
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 1),
+            'stages': {name: round(ms, 1) for name, ms in self.stages.items()},
+            'frames': self.frames,
+            **fields,
+        }
+
+    def log(self, **fields):
+        if self.enabled:
+            logger.info(json.dumps(self.record(**fields), default=str))
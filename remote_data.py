@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import urllib.error
+import urllib.request
+
+# Local copies of the app's data files. A file that is already here is only downloaded again when the server
+# says it changed: the request carries the ETag and Last-Modified of the local copy, and a 304 reply keeps it.
+# When the server can't be reached the local copy is used as it is. Paths that aren't URLs are read directly.
+
+cache_folder = os.path.join(tempfile.gettempdir(), 'qantaswine_data')
+timeout = 30
+
+
+def local_paths(url, folder):
+    name = hashlib.sha256(url.encode()).hexdigest()[:16]
+    return os.path.join(folder, name), os.path.join(folder, name + '.json')
+
+
+def replace_file(path, write):
+    # write(file) into a temporary file of its own next to path, then move it over path, so sessions downloading
+    # the same url at the same time never write into the same file
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            write(file)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def fetch(url, folder=cache_folder):
+    # path of an up to date local copy of url, and whether it was downloaded this time
+    if not url.startswith(('http://', 'https://')):
+        return url, False
+
+    path, meta_path = local_paths(url, folder)
+    meta = {}
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as file:
+            meta = json.load(file)
+
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout) as response:
+            os.makedirs(folder, exist_ok=True)
+            replace_file(path, lambda file: shutil.copyfileobj(response, file))
+            meta = {'url': url, 'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and meta:
+            return path, False
+        raise
+    except urllib.error.URLError:
+        if meta:
+            print(f"Could not reach {url}, using the local copy")
+            return path, False
+        raise
+
+    replace_file(meta_path, lambda file: file.write(json.dumps(meta).encode('utf-8')))
+    return path, True
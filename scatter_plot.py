@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+# Points of the app's scatter plot. Past webgl_threshold points the figure is drawn with WebGL (scattergl),
+# and past max_points the wines that aren't Pareto-efficient are thinned out: they are binned on a grid of
+# price and cents per point, and the densest cells keep only some of their wines. The Pareto-efficient wines
+# are always drawn. Which wines are kept, and the jitter, come from a hash of the wine_key rather than from a
+# random number generator, so the same inputs always give the same figure.
+
+webgl_threshold = 1000
+max_points = 5000
+grid_size = 100
+jitter_size = 0.1
+
+
+def wine_hash(keys, name, seed=0):
+    # a number in [0, 1) for every wine, fixed by its key. name keeps the numbers of different uses apart
+    hash_key = f'{name}:{seed}'.ljust(16, '.')[:16]
+    hashes = pd.util.hash_pandas_object(pd.Series(keys).astype(object), index=False, hash_key=hash_key).to_numpy()
+    return (hashes >> np.uint64(11)).astype(np.float64) / 2.0 ** 53
+
+
+def jitter(keys, seed=0):
+    # noise in [-jitter_size, jitter_size) for the price and the cents per point of every wine
+    return (
+        (wine_hash(keys, 'price', seed) * 2 - 1) * jitter_size,
+        (wine_hash(keys, 'cents', seed) * 2 - 1) * jitter_size,
+    )
+
+
+def grid_cells(x, y, grid_size):
+    cells = []
+    for values in (x, y):
+        values = np.nan_to_num(values, nan=np.nanmin(values) if np.isfinite(values).any() else 0.0)
+        low, high = values.min(), values.max()
+        scaled = (values - low) / (high - low) * grid_size if high > low else np.zeros(len(values))
+        cells.append(np.minimum(scaled.astype(np.int64), grid_size - 1))
+    return cells[0] * grid_size + cells[1]
+
+
+def thin_points(df, is_efficient, max_points=max_points, grid_size=grid_size, seed=0):
+    # which rows of df to draw: every efficient wine, and as many of the others as fit in max_points
+    keep = np.asarray(is_efficient, dtype=bool).copy()
+    others = np.flatnonzero(~keep)
+    budget = max_points - keep.sum()
+    if len(others) <= budget:
+        return np.ones(len(df), dtype=bool)
+    if budget <= 0:
+        return keep
+
+    cells = grid_cells(df['price_per_bottle'].to_numpy(dtype=np.float64)[others], df['cents_per_point'].to_numpy(dtype=np.float64)[others], grid_size)
+
+    # rank of every wine within its cell, in the order of its hash
+    hashes = wine_hash(df['wine_key'].to_numpy()[others], 'sample', seed)
+    order = np.lexsort((hashes, cells))
+    sorted_cells = cells[order]
+    starts = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+    rank = np.empty(len(others), dtype=np.int64)
+    rank[order] = np.arange(len(others)) - np.repeat(starts, np.diff(np.r_[starts, len(others)]))
+
+    # the largest number of wines per cell that fits in the budget: sparse cells keep all of theirs
+    counts = np.sort(np.diff(np.r_[starts, len(others)]))
+    low, high = 0, counts[-1]
+    while low < high:
+        cap = (low + high + 1) // 2
+        if np.minimum(counts, cap).sum() <= budget:
+            low = cap
+        else:
+            high = cap - 1
+
+    keep[others[rank < low]] = True
+    # what is left of the budget goes to one more wine from some of the denser cells
+    extra = np.flatnonzero(rank == low)
+    extra = extra[np.argsort(hashes[extra])][:budget - np.minimum(counts, low).sum()]
+    keep[others[extra]] = True
+    return keep
+
+
+def render_mode(n_points):
+    return 'webgl' if n_points > webgl_threshold else 'svg'
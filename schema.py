@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+# Column types shared by the scd build and the app.
+# Dates are datetime64[s] rather than 'YYYY-MM-DD' strings: 8 bytes a value, compared as numbers, and unlike
+# datetime64[ns] (which stops in 2262) they reach the '9999-12-31' that marks open versions.
+# Prices that are shown stay float64: as float32, 19.99 would be shown as 19.989999771118164.
+
+date_dtype = 'datetime64[s]'
+date_format = '%Y-%m-%d'
+open_date = np.datetime64('9999-12-31', 's')
+
+
+# The scd csv columns the app reads, with their types in the file. Dates stay text until the rows that are
+# needed have been picked, the bonus points have gaps for products without a price
+scd_dtypes = {
+    'wine_key': 'str',
+    'wine_name': 'str',
+    'slug': 'str',
+    'eff_from': 'str',
+    'eff_to': 'str',
+    'rec_deleted_flag': 'int8',
+    'currentprice_cashprice': 'float64',
+    'currentprice_bonusPoint': 'Int32',
+}
+
+
+def scd_column_types(columns):
+    return {col: scd_dtypes[col] for col in columns}
+
+
+def to_dates(values):
+    # 'YYYY-MM-DD' strings, or dates already, as datetime64[s]
+    return pd.Series(values).astype(date_dtype)
+
+
+def frame_memory(df):
+    # bytes used by each column, including the strings an object column points to
+    return df.memory_usage(deep=True, index=False)
+
+
+def memory_report(frames):
+    # frames: {name: (before, after)}, one row per frame with its size in MB either way
+    rows = []
+    for name, (before, after) in frames.items():
+        before_mb, after_mb = frame_memory(before).sum() / 1e6, frame_memory(after).sum() / 1e6
+        rows.append({
+            'frame': name, 'rows': len(after), 'before_mb': round(before_mb, 2), 'after_mb': round(after_mb, 2),
+            'reduction': f'{1 - after_mb / before_mb:.0%}' if before_mb else '',
+        })
+    return pd.DataFrame(rows)
@@ -1,48 +1,190 @@
 import json
 import os
-from playwright.sync_api import sync_playwright
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from playwright.async_api import async_playwright
+from next_data import make_session, fetch_next_data_with_retries
+from fingerprints import unchanged_marker_filename
 
-# Create a 'temp' directory in the same location as the Python script if it doesn't exist
-os.makedirs('temp', exist_ok=True)
+# The page dumps go to a 'temp' directory, created if it doesn't exist
+json_folder = 'temp'
 
-with sync_playwright() as p:
-    browser = p.chromium.launch(headless=False)  # Launch browser in non-headless mode
-    page = browser.new_page()
+base_url = 'https://wine.qantas.com'
 
-    # Navigate to the specific page with BonusPoints filter
-    page.goto('https://wine.qantas.com/c/browse-products?BonusPoints=1')
-    
-    # Extract the number of pages by locating the 'page-last' link
-    last_page_link = page.locator('a[data-testid="page-last"]').get_attribute('href')
 
+def page_url(base_url, page_number):
+    if page_number == 1:
+        # The first page with the BonusPoints filter
+        return f'{base_url}/c/browse-products?BonusPoints=1'
+    # e.g. https://wine.qantas.com/c/browse-products/page-2?BonusPoints=1&sort=featured
+    return f'{base_url}/c/browse-products/page-{page_number}?BonusPoints=1&sort=featured'
+
+
+def save_page(page_number, json_data):
+    # Save the JSON to a file inside the 'temp' folder
+    with open(os.path.join(json_folder, f'json_dump_page_{page_number}.json'), 'w', encoding='utf-8') as json_file:
+        json.dump(json_data, json_file, indent=4)
+
+
+async def extract_page(page, url):
+    await page.goto(url)
+
+    # Extract JSON data from the script tag with id '__NEXT_DATA__'
+    script_content = await page.locator("script#__NEXT_DATA__").evaluate("el => el.textContent")
+
+    # Load the JSON content into a Python dictionary
+    return json.loads(script_content)
+
+
+async def extract_page_with_retries(page, url, retries, backoff):
+    for attempt in range(retries + 1):
+        try:
+            return await extract_page(page, url)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+            print(f"Failed to extract {url} ({e}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+def last_page_from_link(last_page_link):
     # Extract the page number from the 'href' attribute
     if last_page_link:
-        last_page_number = last_page_link.split('-')[-1]  # Assumes the page number is at the end of the URL
+        last_page_number = last_page_link.split('-')[-1].split('?')[0]  # Assumes the page number is at the end of the URL path
         print(f"Total number of pages: {last_page_number}")
-    else:
-        print("Could not find the last page link.")
-        
-    # Convert the last page number to an integer
-    last_page_number = int(last_page_number)
-    
-    # For each page, extract the JSON data and save it to a file as json_dump_page_{page_number}.json
-    # We're already on the first, so we don't need to navigate to it
-    for page_number in range(1, last_page_number + 1):
-        
-        if page_number > 1:
-            # Navigate to the next page e.g. https://wine.qantas.com/c/browse-products/page-2?BonusPoints=1&sort=featured
-            page.goto(f'https://wine.qantas.com/c/browse-products/page-{page_number}?BonusPoints=1&sort=featured')
-
-        # Extract JSON data from the script tag with id '__NEXT_DATA__'
-        script_content = page.locator("script#__NEXT_DATA__").evaluate("el => el.textContent")
-
-        # Load the JSON content into a Python dictionary
-        json_data = json.loads(script_content)
-
-        # Save the JSON to a file inside the 'temp' folder
-        with open(os.path.join('temp', f'json_dump_page_{page_number}.json'), 'w', encoding='utf-8') as json_file:
-            json.dump(json_data, json_file, indent=4)
-
-    # Ensure that the Playwright browser is closed
-    page.close()
-    browser.close()
+        return int(last_page_number)
+
+    print("Could not find the last page link, assuming a single page.")
+    return 1
+
+
+async def find_last_page(page):
+    # Extract the number of pages by locating the 'page-last' link
+    return last_page_from_link(await page.locator('a[data-testid="page-last"]').get_attribute('href'))
+
+
+def scrape_http(base_url, concurrency=4, retries=3, backoff=1.0):
+    # Fetch the pages without a browser. Returns the page numbers that failed, for scrape() to pick up
+    os.makedirs(json_folder, exist_ok=True)
+    session = make_session(concurrency)
+
+    json_data, last_page_link = fetch_next_data_with_retries(session, page_url(base_url, 1), retries, backoff, want_last_page=True)
+    if last_page_link is None:
+        # a page without its pagination isn't proof of a single page, only the browser gets to decide that
+        session.close()
+        raise ValueError("No page-last link in the first page")
+    save_page(1, json_data)
+    last_page_number = last_page_from_link(last_page_link)
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(fetch_next_data_with_retries, session, page_url(base_url, page_number), retries, backoff): page_number
+            for page_number in range(2, last_page_number + 1)
+        }
+        for future in as_completed(futures):
+            try:
+                save_page(futures[future], future.result()[0])
+            except Exception as e:
+                print(f"Could not fetch page {futures[future]} without a browser: {e}")
+                failed.append(futures[future])
+
+    session.close()
+    return sorted(failed)
+
+
+async def scrape(base_url, page_numbers=None, concurrency=4, retries=3, backoff=1.0, headless=True):
+    # Returns the page numbers that could not be scraped, after trying every other page
+    os.makedirs(json_folder, exist_ok=True)
+    failed = []
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=headless)
+        try:
+            context = await browser.new_context()
+            try:
+                if page_numbers is None:
+                    # The first page gives both its own products and the number of pages
+                    first_page = await context.new_page()
+                    try:
+                        save_page(1, await extract_page_with_retries(first_page, page_url(base_url, 1), retries, backoff))
+                        page_numbers = range(2, await find_last_page(first_page) + 1)
+                    finally:
+                        await first_page.close()
+
+                # For each of the other pages, extract the JSON data with a bounded pool of pages
+                queue = asyncio.Queue()
+                for page_number in page_numbers:
+                    queue.put_nowait(page_number)
+
+                async def worker():
+                    page = await context.new_page()
+                    try:
+                        while not queue.empty():
+                            page_number = queue.get_nowait()
+                            try:
+                                json_data = await extract_page_with_retries(page, page_url(base_url, page_number), retries, backoff)
+                                save_page(page_number, json_data)
+                            except Exception as e:
+                                # one page giving up doesn't stop the others
+                                print(f"Could not extract page {page_number}: {e}")
+                                failed.append(page_number)
+                    finally:
+                        await page.close()
+
+                workers = min(concurrency, len(page_numbers))
+                await asyncio.gather(*[worker() for _ in range(workers)])
+            finally:
+                # Ensure that the Playwright browser is closed, whatever happened
+                await context.close()
+        finally:
+            await browser.close()
+
+    return sorted(failed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Save the __NEXT_DATA__ JSON of every BonusPoints product page')
+    parser.add_argument('--base-url', default=base_url, help='site to scrape, e.g. a local stand-in server for testing')
+    parser.add_argument('--concurrency', type=int, default=4, help='number of pages scraped at the same time')
+    parser.add_argument('--retries', type=int, default=3, help='retries per page before giving up')
+    parser.add_argument('--backoff', type=float, default=1.0, help='seconds before the first retry, doubling each time')
+    parser.add_argument('--headed', action='store_true', help='show the browser window')
+    parser.add_argument(
+        '--extractor', choices=['auto', 'http', 'browser'], default='auto',
+        help="'http' fetches the pages without a browser, 'browser' uses Playwright, "
+             "'auto' tries http first and uses Playwright for whatever failed"
+    )
+    args = parser.parse_args()
+    args.base_url = args.base_url.rstrip('/')
+    args.concurrency = max(1, args.concurrency)
+
+    # a new scrape, so forget whether the last one was unchanged
+    if os.path.exists(os.path.join(json_folder, unchanged_marker_filename)):
+        os.remove(os.path.join(json_folder, unchanged_marker_filename))
+
+    # None means every page still has to be scraped with the browser
+    browser_pages = None
+    if args.extractor in ('auto', 'http'):
+        try:
+            browser_pages = scrape_http(args.base_url, concurrency=args.concurrency, retries=args.retries, backoff=args.backoff)
+        except Exception as e:
+            if args.extractor == 'http':
+                raise
+            print(f"Fetching without a browser failed ({e}), falling back to Playwright")
+        if args.extractor == 'http' and browser_pages:
+            raise SystemExit(f"Could not fetch pages {browser_pages}")
+
+    if browser_pages is None or browser_pages:
+        failed_pages = asyncio.run(scrape(
+            args.base_url,
+            page_numbers=browser_pages,
+            concurrency=args.concurrency,
+            retries=args.retries,
+            backoff=args.backoff,
+            headless=not args.headed
+        ))
+        if failed_pages:
+            raise SystemExit(f"Could not scrape pages {failed_pages}")
@@ -0,0 +1,32 @@
+import json
+import os
+from datetime import datetime
+from fingerprints import (
+    json_folder, fingerprints_filename, unchanged_marker_filename,
+    page_fingerprints, load_last_fingerprints, record_unchanged_snapshot
+)
+
+# Step 1: Fingerprint the products of every json_dump_page_{page_number}.json file in the 'temp' folder
+fingerprints = page_fingerprints(json_folder)
+with open(os.path.join(json_folder, fingerprints_filename), 'w', encoding='utf-8') as file:
+    json.dump(fingerprints, file, indent=4)
+
+# Step 2: Compare them with the fingerprints of the last archived snapshot
+last = load_last_fingerprints()
+if fingerprints and last and last['pages'] == fingerprints:
+    # Step 3: Nothing changed, so only record when this scrape happened
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    record_unchanged_snapshot(timestamp, last['snapshot_time'])
+
+    # the page dumps are the same as the archived ones, no need to keep them
+    for json_file in list(fingerprints) + [fingerprints_filename]:
+        os.remove(os.path.join(json_folder, json_file))
+
+    # tell steps 02 to 05 there is nothing to do
+    with open(os.path.join(json_folder, unchanged_marker_filename), 'w', encoding='utf-8') as file:
+        file.write(timestamp)
+
+    print(f"Scrape unchanged since {last['snapshot_time']}, recorded {timestamp} as a repeat of it")
+else:
+    changed = [page for page in fingerprints if not last or last['pages'].get(page) != fingerprints[page]]
+    print(f"{len(changed)} of {len(fingerprints)} pages changed since the last archived snapshot")
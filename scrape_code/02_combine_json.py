@@ -1,38 +1,23 @@
-import json
 import os
+import sys
+from products import page_dump_files, iter_products, write_products
+from fingerprints import scrape_unchanged
+
+# Optional step: 03_create_csv.py reads the page dumps directly, and can write products_extracted.json
+# in the same pass with --combined-json. This writes only the combined JSON.
+
+# Nothing to do when 01b_fingerprint.py found the scrape unchanged
+if scrape_unchanged():
+    print("Scrape unchanged since the last archived snapshot, nothing to combine")
+    sys.exit(0)
 
 # Step 1: Get all of the json_dump_page_{page_number}.json files from the 'temp' folder
 json_folder = 'temp'
-json_files = [f for f in os.listdir(json_folder) if f.startswith('json_dump_page_') and f.endswith('.json')]
+json_files = page_dump_files(json_folder)
 print(json_files)
 
-# Step 2: Iterate through all JSON files and extract the products array, then save it as products_data.json
-products = []
-for json_file in json_files:
-    file_path = os.path.join(json_folder, json_file)
-    with open(file_path, 'r', encoding='utf-8') as file:
-        data = json.load(file)
-        
-        # Check if the data is a dictionary and contains the necessary structure
-        if isinstance(data, dict):
-            try:
-                # Extract products if the key exists
-                product_list = data['props']['pageProps'].get('productSearchResults', {}).get('products', [])
-                if product_list:
-                    products.extend(product_list)
-                else:
-                    print(f"No products found in {json_file}.")
-            except KeyError as e:
-                print(f"Error: {e} key not found in the JSON structure of {json_file}.")
-        else:
-            print(f"Unexpected data type in {json_file}. Expected a dictionary.")
-
-
-# Save the products to a new file or print them
-if products:
-    # Save the products array to a new JSON file
-    with open(os.path.join(json_folder, 'products_extracted.json'), 'w', encoding='utf-8') as output_file:
-        json.dump(products, output_file, indent=4)
+# Step 2: Stream the products array of every JSON file into products_extracted.json
+count = write_products(iter_products(json_folder, json_files), json_path=os.path.join(json_folder, 'products_extracted.json'))
 
-else:
+if not count:
     print("No products found in the JSON file.")
@@ -1,6 +1,10 @@
 import os
-import shutil
+import sys
+import json
 from datetime import datetime
+from snapshot_store import read_snapshot_csv, write_snapshot_parquet
+from archive_store import archive_files, manifest_path
+from fingerprints import fingerprints_filename, scrape_unchanged
 
 # Step 1: Generate a timestamp
 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -10,43 +14,52 @@ current_directory = os.path.dirname(os.path.abspath(__file__))
 
 # Step 3: Define directories relative to the current directory
 temp_folder = os.path.join(current_directory, 'temp')
-archive_dump_folder = os.path.join(current_directory, 'archive/dump')
-archive_combined_folder = os.path.join(current_directory, 'archive/combined')
-archive_csv_folder = os.path.join(current_directory, 'archive/csv')
+
+# Nothing to do when 01b_fingerprint.py found the scrape unchanged
+if scrape_unchanged(temp_folder):
+    print("Scrape unchanged since the last archived snapshot, nothing to archive")
+    sys.exit(0)
+
+archive_folder = os.path.join(current_directory, 'archive')
+archive_parquet_folder = os.path.join(current_directory, 'archive/parquet')
 
 # Step 4: Ensure archive directories exist
-os.makedirs(archive_dump_folder, exist_ok=True)
-os.makedirs(archive_combined_folder, exist_ok=True)
-os.makedirs(archive_csv_folder, exist_ok=True)
+os.makedirs(archive_parquet_folder, exist_ok=True)
 
-# Step 5: Move and rename JSON dump files
+# Step 5: Collect the JSON dump files, products_extracted.json and products_data.csv
 json_dump_files = [f for f in os.listdir(temp_folder) if f.startswith('json_dump_page_') and f.endswith('.json')]
+archived_files = list(json_dump_files)
+for f in ['products_extracted.json', 'products_data.csv']:
+    if os.path.exists(os.path.join(temp_folder, f)):
+        archived_files.append(f)
+    else:
+        print(f"{f} not found in {temp_folder}")
 
-for json_file in json_dump_files:
-    old_path = os.path.join(temp_folder, json_file)
-    new_filename = f'{timestamp}_{json_file}'
-    new_path = os.path.join(archive_dump_folder, new_filename)
-    shutil.move(old_path, new_path)
-    print(f"Moved {json_file} to {new_path}")
-
-# Step 6: Move and rename products_extracted.json
-extracted_file = 'products_extracted.json'
-old_extracted_path = os.path.join(temp_folder, extracted_file)
-if os.path.exists(old_extracted_path):
-    new_extracted_filename = f'{timestamp}_{extracted_file}'
-    new_extracted_path = os.path.join(archive_combined_folder, new_extracted_filename)
-    shutil.move(old_extracted_path, new_extracted_path)
-    print(f"Moved {extracted_file} to {new_extracted_path}")
-else:
-    print(f"{extracted_file} not found in {temp_folder}")
-
-# Step 7: Move and rename products_data.csv
+# Step 6: Write a typed parquet copy of the snapshot for 05_scd.py
 csv_file = 'products_data.csv'
-old_csv_path = os.path.join(temp_folder, csv_file)
-if os.path.exists(old_csv_path):
-    new_csv_filename = f'{timestamp}_{csv_file}'
-    new_csv_path = os.path.join(archive_csv_folder, new_csv_filename)
-    shutil.move(old_csv_path, new_csv_path)
-    print(f"Moved {csv_file} to {new_csv_path}")
-else:
-    print(f"{csv_file} not found in {temp_folder}")
+if csv_file in archived_files:
+    new_parquet_path = os.path.join(archive_parquet_folder, f'{timestamp}_products_data.parquet')
+    write_snapshot_parquet(read_snapshot_csv(os.path.join(temp_folder, csv_file), datetime.strptime(timestamp, '%Y%m%d_%H%M%S')), new_parquet_path)
+    print(f"Wrote {new_parquet_path}")
+
+# Step 7: Store the files as compressed blobs, only the ones not seen in an earlier run take up space
+archive_files(timestamp, [os.path.join(temp_folder, f) for f in archived_files], archive_folder)
+print(f"Archived {len(archived_files)} files to {manifest_path(timestamp, archive_folder)}")
+
+# Step 8: Remove the archived files from the 'temp' folder
+for f in archived_files:
+    os.remove(os.path.join(temp_folder, f))
+
+# Step 9: Keep the page fingerprints of this snapshot, for 01b_fingerprint.py to compare the next scrape with
+fingerprints_path = os.path.join(temp_folder, fingerprints_filename)
+last_fingerprints_path = os.path.join(current_directory, 'archive/last_fingerprints.json')
+if os.path.exists(fingerprints_path):
+    with open(fingerprints_path, 'r', encoding='utf-8') as file:
+        pages = json.load(file)
+    with open(last_fingerprints_path, 'w', encoding='utf-8') as file:
+        json.dump({'snapshot_time': timestamp, 'pages': pages}, file, indent=4)
+    os.remove(fingerprints_path)
+    print(f"Wrote {last_fingerprints_path}")
+elif os.path.exists(last_fingerprints_path):
+    # fingerprints of an older snapshot would let a scrape match it instead of this one
+    os.remove(last_fingerprints_path)
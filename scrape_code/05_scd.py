@@ -1,218 +1,181 @@
-import pandas as pd
-import os
-from datetime import datetime
-import pandasql as psql
-import hashlib
-from tabulate import tabulate
-
-checksum_columns = [
-    'wine_name', 'slug', 'casevariant_1', 'casevariant_2', 'casevariant_3',
-    'casevariant_4', 'casevariant_5', 'currentprice_cashprice', 
-    'currentprice_bonusPoint', 'validfrom', 'validto'
-]
-
-# Step 1: Load CSV files
-path = 'archive/csv'
-all_files = [os.path.join(path, f) for f in os.listdir(path) if f.endswith('.csv')]
-
-dataframes = []
-for file in all_files:
-    # Extract the date and time from the filename, e.g., '20240818_152850'
-    timestamp_str = os.path.basename(file).split('_')[0] + os.path.basename(file).split('_')[1]
-    snapshot_time = datetime.strptime(timestamp_str, '%Y%m%d%H%M%S')  # Convert string to datetime
-    
-    df = pd.read_csv(file)
-    df['snapshot_time'] = snapshot_time  # Add the snapshot_time column to the DataFrame
-    dataframes.append(df)
-
-# Combine all dataframes
-df_combined = pd.concat(dataframes)
-
-# rename columns name and key to wine_name and wine_key
-df_combined = df_combined.rename(columns={'name': 'wine_name', 'key': 'wine_key'})
-
-"""
-# print the table in ascii form using tabulate library
-
-print(tabulate(df_combined.head(), headers='keys', tablefmt='psql'))
-
-# print schema of df_combined
-print(df_combined.dtypes)
-"""
-
-# select only one record per key based on the latest snapshot_time
-df_01 = psql.sqldf("""
---sql
-select
-b.*,
-row_number() over (partition by wine_key, snapshot_date order by snapshot_time desc) as rn_01
-from
-(
-    select
-    a.*,
-    substr(snapshot_time, 1, 10) as snapshot_date
-    from 
-    df_combined a
-) b 
-order by wine_key, snapshot_time desc
---endsql
-""")
-# print schema of df_01
-#print(df_01.dtypes)
-#print(tabulate(df_01.head(), headers='keys', tablefmt='psql'))
-
-df_02 = psql.sqldf("""
---sql
-select 
-*
-from df_01
-where rn_01 = 1
---endsql
-""")
-    
-
-# Create checksums to detect changes based on the specified changing columns
-df_02['record_checksum'] = df_02.apply(
-    lambda row: hashlib.md5(
-        ''.join([str(row[col]) for col in checksum_columns]).encode()
-    ).hexdigest(), 
-    axis=1
-)
-
-columns_str_df_02 = ', '.join(checksum_columns)
-
-# SQL query using the dynamically constructed column string
-df_02_distinct = psql.sqldf(f"""
---sql
-select distinct
-record_checksum,
-{columns_str_df_02}
-from
-df_02
---endsql
-""")
-
-# get the min and max snapshot_date for each wine_key and checksum
-df_03 = psql.sqldf("""
---sql
-select
-wine_key,
-record_checksum,
-min(snapshot_date) as eff_from,
-max(snapshot_date) as eff_to
-from df_02
-group by
-wine_key,
-record_checksum
-order by wine_key, eff_from
---endsql
-""")
-
-# print any records with multitple counts group by wine_key. use python code
-#psql.sqldf("""select wine_key, count(*) from df_03 group by wine_key having count(*) > 1""")
-
-# get all of the unique keys across all snapshots
-df_04 = psql.sqldf("""
---sql
-select
-distinct
-wine_key
-from 
-df_03
---endsql
-""")
-
-# get the global lastest eff_to
-df_05 = psql.sqldf("""
---sql
-select
-max(eff_to) as global_max_eff_to
-from df_03
---endsql
-""")
-
-# get the max_eff_to of each key
-df_06 = psql.sqldf("""
---sql
-select
-wine_key,
-max(eff_to) as max_eff_to
-from df_03  
-group by
-wine_key
---endsql
-""")
-
-# flag which records are deleted
-df_07 = psql.sqldf("""
---sql
-select
-a.wine_key,
-a.max_eff_to,
-b.global_max_eff_to,
-
-case
-when a.max_eff_to = b.global_max_eff_to then 0
-else 1
-end as rec_deleted_flag
-
-from
-df_06 a
-cross join df_05 b    
---endsql
-""")       
-
-
-# now combine tables
-df_08 = psql.sqldf("""
---sql
-select
-a.wine_key,
-a.record_checksum,
-a.eff_from,
-a.eff_to as eff_to_original,
-
-b.max_eff_to,
-
-case
-when a.eff_to = b.max_eff_to then '9999-12-31'
-else a.eff_to
-end as eff_to,
-
-case
-when a.eff_to = b.max_eff_to and c.rec_deleted_flag = 1 then 1
-else 0
-end as rec_deleted_flag
-
--- this is wine_key, checksum, eff_from, eff_to, max_eff_to table
-from df_03 a
--- left join on max_eff_to of wine_key
-left join df_06 b on a.wine_key = b.wine_key
--- left join on which records are deleted
-left join df_07 c on a.wine_key = c.wine_key
-order by a.wine_key, a.eff_from desc
---endsql
-""")
-
-# Convert the list of columns to a comma-separated string with table alias `b`
-df_09_columns_str = ', '.join([f'b.{col}' for col in checksum_columns])
-
-# join back the original data from df_02. only select the check_sum_columns
-df_09 = psql.sqldf(f"""
---sql
-select
-a.wine_key,
-a.eff_from,
-a.eff_to,
-a.rec_deleted_flag,
-a.record_checksum,
-{df_09_columns_str}
-from
-df_08 a
-left join df_02_distinct b on b.record_checksum = a.record_checksum
---endsql
-""")
-
-# write scd file to /sdc folder
-df_09.to_csv('scd/qantas_bonuspoints_true.csv', index=False)
-
+import pandas as pd
+import os
+import sys
+import argparse
+from tabulate import tabulate
+from snapshot_store import list_snapshots, read_snapshots, snapshot_columns
+from fingerprints import scrape_unchanged
+from scd_engine import (
+    checksum_columns, checksum_modes, text_columns, number_columns, coerce_types, float_columns,
+    daily_records, aggregate_versions, merge_versions, build_scd
+)
+
+# current_view.py and schema.py are shared with the app in the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from schema import date_dtype, date_format
+from current_view import build_current_view, write_current_view
+from price_history import build_history, write_history
+from changes import listing_columns, snapshot_changes, read_changes, update_changes, write_changes
+
+scd_file = 'scd/qantas_bonuspoints_true.csv'
+current_view_file = 'scd/qantas_bonuspoints_current.parquet'
+history_file = 'scd/qantas_bonuspoints_history.parquet'
+changes_file = 'scd/qantas_bonuspoints_changes.parquet'
+
+# The state file keeps, for every wine_key and checksum, the eff_from/eff_to before the renaming to
+# '9999-12-31', plus closed_eff_to: the last date the version was seen *before* the latest snapshot date.
+# The latest snapshot date can still receive scrapes later that day, so it is always re-read from the archive.
+state_file = 'scd/qantas_bonuspoints_true_state.csv'
+
+
+# wine_key and slug repeat in every snapshot, so they are read as categoricals
+categorical_columns = ['key', 'slug']
+
+
+def load_snapshots(snapshots, workers=1, pool='thread'):
+    # read only the columns the scd needs, from the parquet copy where there is one, and combine them
+    df_combined = read_snapshots(snapshots, columns=snapshot_columns, workers=workers, pool=pool, categories=categorical_columns)
+
+    # rename columns name and key to wine_name and wine_key
+    df_combined = df_combined.rename(columns={'name': 'wine_name', 'key': 'wine_key'})
+
+    """
+    # print the table in ascii form using tabulate library
+
+    print(tabulate(df_combined.head(), headers='keys', tablefmt='psql'))
+
+    # print schema of df_combined
+    print(df_combined.dtypes)
+    """
+
+    # the numbers stay float64 until run() knows which of them the whole history has as floats
+    return coerce_types(df_combined, floats=list(number_columns))
+
+
+def load_state(checksum_mode):
+    if not (os.path.exists(state_file) and os.path.exists(scd_file)):
+        return None
+    if not os.path.exists(changes_file):
+        print("No changes file next to the scd file, rebuilding both")
+        return None
+    state = pd.read_csv(state_file, dtype=str)
+    if state.empty:
+        return None
+
+    # the latest snapshot date, as the 'YYYY-MM-DD' list_snapshots compares file dates with
+    watermark = state['eff_to'].max()
+    state = state.astype({'eff_from': date_dtype, 'eff_to': date_dtype, 'closed_eff_to': date_dtype})
+
+    # versions already closed before the latest snapshot date
+    closed = state[state['closed_eff_to'].notna()][['wine_key', 'record_checksum', 'eff_from', 'closed_eff_to']]
+    closed = closed.rename(columns={'closed_eff_to': 'eff_to'})
+
+    # the column values of every known checksum are already in the current scd file
+    # the text as text like in read_snapshot_csv (a case variant '06' stays '06'), and the numbers as written,
+    # so that '5000.0' tells the points were floats
+    df_scd = pd.read_csv(
+        scd_file, dtype={'record_checksum': str, **dict.fromkeys(text_columns, str), **dict.fromkeys(number_columns, str)}
+    )
+    floats = float_columns(df_scd)
+    for col in number_columns:
+        df_scd[col] = pd.to_numeric(df_scd[col])
+    known = df_scd[['record_checksum'] + checksum_columns]
+
+    if not known['record_checksum'].str.len().eq(checksum_modes[checksum_mode]).all():
+        print(f"The scd file was not built with '{checksum_mode}' checksums, rebuilding it")
+        return None
+
+    return watermark, closed, known, floats, read_changes(changes_file)
+
+
+def previous_listing(closed, known):
+    # the wines of the last snapshot date before the latest one: the versions last seen before the latest
+    # snapshot date were last seen on it, unless that was earlier. None when there is no such date
+    if closed.empty:
+        return None
+    listing = closed[closed['eff_to'] == closed['eff_to'].max()].rename(columns={'eff_to': 'snapshot_date'})
+    return listing.merge(known.drop_duplicates(subset='record_checksum'), on='record_checksum', how='left')[listing_columns]
+
+
+def run(full_rebuild=False, checksum_mode='md5', workers=1, pool='thread'):
+    state = None if full_rebuild else load_state(checksum_mode)
+    if state is None:
+        # full rebuild: replay every archived snapshot
+        watermark, closed, known, known_floats, existing_changes = None, pd.DataFrame(), pd.DataFrame(), [], None
+    else:
+        watermark, closed, known, known_floats, existing_changes = state
+
+    # Step 1: Load the snapshots from the latest snapshot date onwards
+    snapshots = list_snapshots(from_date=watermark)
+    print(f"Loading {len(snapshots)} snapshot(s)" + (f" from {watermark}" if watermark else ""))
+    df_combined = load_snapshots(snapshots, workers=workers, pool=pool)
+
+    # a first gap or fraction in a number column changes how the whole history of that column is hashed
+    floats = float_columns(df_combined, known)
+    if state is not None and floats != known_floats:
+        print(f"New float column(s) {', '.join(sorted(set(floats) - set(known_floats)))}, rebuilding the scd file")
+        return run(full_rebuild=True, checksum_mode=checksum_mode, workers=workers, pool=pool)
+    known = coerce_types(known, floats)
+    df_02 = daily_records(coerce_types(df_combined, floats), checksum_mode=checksum_mode)
+    closed_before = closed
+
+    # Step 2: Keep one record per key and day, and merge the new versions into the existing ones
+    df_03 = merge_versions(closed, aggregate_versions(df_02))
+    df_02_distinct = (
+        pd.concat([known, df_02[['record_checksum'] + checksum_columns]], ignore_index=True)
+        .drop_duplicates(subset='record_checksum')
+    )
+
+    # Step 3: Build the scd table
+    df_09 = build_scd(df_03, df_02_distinct)
+
+    # Step 4: Build the state for the next run, holding back the latest snapshot date
+    latest_date = df_02['snapshot_date'].max()
+    closed = merge_versions(closed, aggregate_versions(df_02[df_02['snapshot_date'] < latest_date]))
+    df_state = df_03.merge(
+        closed[['wine_key', 'record_checksum', 'eff_to']].rename(columns={'eff_to': 'closed_eff_to'}),
+        on=['wine_key', 'record_checksum'],
+        how='left'
+    ).sort_values(['wine_key', 'eff_from'])
+
+    # Step 5: What changed on the snapshot dates from the latest one of the previous build on
+    df_changes = update_changes(existing_changes, snapshot_changes(df_02, previous_listing(closed_before, known)), watermark)
+
+    return df_09, df_state, df_changes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the scd table from the archived snapshots')
+    parser.add_argument('--full-rebuild', action='store_true', help='replay every archived snapshot instead of only the new ones')
+    parser.add_argument('--checksum', choices=list(checksum_modes), default='md5', help="'md5' keeps the existing checksums, 'fast' uses a vectorized 64-bit hash")
+    parser.add_argument('--verify', action='store_true', help='check the incremental build against a full rebuild')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='number of snapshots read at the same time')
+    parser.add_argument('--pool', choices=['thread', 'process'], default='thread', help="'process' also parses archived csv snapshots in parallel")
+    args = parser.parse_args()
+
+    # an unchanged scrape leaves the scd table as it is, the next build picks up its snapshot time
+    if scrape_unchanged() and not (args.full_rebuild or args.verify):
+        print("Scrape unchanged since the last archived snapshot, scd table is up to date")
+        sys.exit(0)
+
+    df_09, df_state, df_changes = run(full_rebuild=args.full_rebuild, checksum_mode=args.checksum, workers=args.workers, pool=args.pool)
+
+    if args.verify and not args.full_rebuild:
+        df_full, _, df_full_changes = run(full_rebuild=True, checksum_mode=args.checksum, workers=args.workers, pool=args.pool)
+        if df_full.to_csv(index=False) != df_09.to_csv(index=False):
+            raise SystemExit('Incremental scd build does not match a full rebuild')
+        if df_full_changes.to_csv(index=False) != df_changes.to_csv(index=False):
+            raise SystemExit('Incremental changes do not match a full rebuild')
+        print('Incremental scd build matches a full rebuild')
+
+    # write scd file to /sdc folder
+    os.makedirs('scd', exist_ok=True)
+    df_09.to_csv(scd_file, index=False, date_format=date_format)
+    df_state.to_csv(state_file, index=False, date_format=date_format)
+
+    # write the current view and the per wine history the app loads
+    write_current_view(build_current_view(df_09), current_view_file)
+    write_history(build_history(df_09, df_state), history_file)
+
+    # and what changed from one snapshot date to the next
+    write_changes(df_changes, changes_file)
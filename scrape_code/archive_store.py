@@ -0,0 +1,170 @@
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+
+# Content addressed archive of the scraped files. Every file is stored once as a compressed blob named after
+# the sha256 of its contents, so pages that did not change between runs take no extra space. Each run writes
+# a manifest listing the blob of every file it archived, e.g. archive/manifests/20240818_152850.json.
+# Run this file directly with 'migrate' to move the old archive/dump, archive/combined and archive/csv files in.
+
+archive_folder = 'archive'
+
+# blob file extension of every compression, the blob reader goes by the extension
+compressions = {'gzip': '.gz', 'zstd': '.zst'}
+
+# folders written by 04_process.py before the blob store, and the files they hold
+legacy_folders = ['dump', 'combined', 'csv']
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd compression needs the zstandard package, install it with 'pip install zstandard'")
+    return zstandard
+
+
+def compress(data, compression='gzip'):
+    if compression == 'gzip':
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if compression == 'zstd':
+        return _zstandard().ZstdCompressor(level=19).compress(data)
+    raise ValueError(f"Unknown compression {compression!r}, expected one of {list(compressions)}")
+
+
+def decompress(data, extension):
+    if extension == compressions['gzip']:
+        return gzip.decompress(data)
+    return _zstandard().ZstdDecompressor().decompress(data)
+
+
+def blob_path(digest, extension, archive_folder=archive_folder):
+    return os.path.join(archive_folder, 'blobs', digest[:2], digest + extension)
+
+
+def find_blob(digest, archive_folder=archive_folder):
+    for extension in compressions.values():
+        path = blob_path(digest, extension, archive_folder)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def put_blob(data, archive_folder=archive_folder, compression='gzip'):
+    digest = hashlib.sha256(data).hexdigest()
+    if find_blob(digest, archive_folder) is None:
+        path = blob_path(digest, compressions[compression], archive_folder)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as file:
+            file.write(compress(data, compression))
+        os.replace(path + '.tmp', path)  # a blob is either complete or not there
+    return digest
+
+
+def get_blob(digest, archive_folder=archive_folder):
+    path = find_blob(digest, archive_folder)
+    if path is None:
+        raise FileNotFoundError(f"Blob {digest} not found in {archive_folder}")
+    with open(path, 'rb') as file:
+        return decompress(file.read(), os.path.splitext(path)[1])
+
+
+def manifest_path(timestamp, archive_folder=archive_folder):
+    return os.path.join(archive_folder, 'manifests', f'{timestamp}.json')
+
+
+def read_manifest(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def write_manifest(timestamp, files, archive_folder=archive_folder):
+    path = manifest_path(timestamp, archive_folder)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump({'snapshot_time': timestamp, 'files': files}, file, indent=4, sort_keys=True)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def list_manifests(archive_folder=archive_folder):
+    # archive timestamps of every run, oldest first
+    folder = os.path.join(archive_folder, 'manifests')
+    if not os.path.isdir(folder):
+        return []
+    return sorted(f[:-len('.json')] for f in os.listdir(folder) if f.endswith('.json'))
+
+
+def archive_files(timestamp, paths, archive_folder=archive_folder, compression='gzip'):
+    # store every file as a blob and add it to the manifest of the run, returns {filename: digest}
+    path = manifest_path(timestamp, archive_folder)
+    files = read_manifest(path)['files'] if os.path.exists(path) else {}
+    for file_path in paths:
+        with open(file_path, 'rb') as file:
+            files[os.path.basename(file_path)] = put_blob(file.read(), archive_folder, compression)
+    write_manifest(timestamp, files, archive_folder)
+    return files
+
+
+def read_file(manifest, filename, archive_folder=archive_folder):
+    return get_blob(manifest['files'][filename], archive_folder)
+
+
+def open_file(manifest, filename, archive_folder=archive_folder):
+    return io.BytesIO(read_file(manifest, filename, archive_folder))
+
+
+def iter_snapshots(filename='products_data.csv', archive_folder=archive_folder):
+    # (timestamp, manifest) of every run that archived filename, oldest first
+    for timestamp in list_manifests(archive_folder):
+        manifest = read_manifest(manifest_path(timestamp, archive_folder))
+        if filename in manifest['files']:
+            yield timestamp, manifest
+
+
+def migrate(archive_folder=archive_folder, compression='gzip', delete=False):
+    # group the legacy files by the timestamp prefix of their name, e.g. '20240818_152850_json_dump_page_1.json'
+    runs = {}
+    for folder in legacy_folders:
+        folder = os.path.join(archive_folder, folder)
+        if not os.path.isdir(folder):
+            continue
+        for f in sorted(os.listdir(folder)):
+            runs.setdefault(f[:15], []).append((os.path.join(folder, f), f[16:]))
+
+    size_before = 0
+    for timestamp in sorted(runs):
+        path = manifest_path(timestamp, archive_folder)
+        files = read_manifest(path)['files'] if os.path.exists(path) else {}
+        for file_path, filename in runs[timestamp]:
+            with open(file_path, 'rb') as file:
+                data = file.read()
+            size_before += len(data)
+            files[filename] = put_blob(data, archive_folder, compression)
+            # only remove the original once its blob reads back the same
+            if delete and get_blob(files[filename], archive_folder) == data:
+                os.remove(file_path)
+        write_manifest(timestamp, files, archive_folder)
+        print(f"Migrated {len(runs[timestamp])} files of {timestamp}")
+
+    size_after = sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, filenames in os.walk(os.path.join(archive_folder, 'blobs')) for f in filenames
+    )
+    print(f"{size_before:,} bytes of legacy files, {size_after:,} bytes of blobs")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Content addressed archive of the scraped files')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help='move the archive/dump, archive/combined and archive/csv files into the blob store')
+    migrate_parser.add_argument('--archive', default=archive_folder, help='archive folder to migrate')
+    migrate_parser.add_argument('--compression', choices=list(compressions), default='gzip')
+    migrate_parser.add_argument('--delete', action='store_true', help='remove the legacy files once they are stored')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        migrate(args.archive, compression=args.compression, delete=args.delete)
@@ -0,0 +1,58 @@
+import csv
+import hashlib
+import json
+import os
+
+from products import page_dump_files
+
+# Change detection between scrapes. 01b_fingerprint.py hashes the products of every page dump and compares
+# them with the fingerprints of the last archived snapshot (kept by 04_process.py). When nothing changed,
+# the scrape is only recorded as a repeat of that snapshot and steps 02 to 05 skip their work.
+# 05_scd.py reads the repeats back as snapshots, so eff_from/eff_to come out as if every scrape was archived.
+
+json_folder = 'temp'
+fingerprints_filename = 'fingerprints.json'
+unchanged_marker_filename = 'unchanged.txt'
+
+last_fingerprints_file = 'archive/last_fingerprints.json'
+unchanged_snapshots_file = 'archive/unchanged_snapshots.csv'
+
+
+def page_fingerprints(json_folder):
+    fingerprints = {}
+    for json_file in page_dump_files(json_folder):
+        with open(os.path.join(json_folder, json_file), 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        page_props = data.get('props', {}).get('pageProps', {}) if isinstance(data, dict) else {}
+        products = (page_props.get('productSearchResults') or {}).get('products', [])
+        fingerprints[json_file] = hashlib.sha256(json.dumps(products, sort_keys=True).encode()).hexdigest()
+    return fingerprints
+
+
+def load_last_fingerprints(path=last_fingerprints_file):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def record_unchanged_snapshot(snapshot_time, same_as, path=unchanged_snapshots_file):
+    # snapshot_time and same_as are archive timestamps, e.g. '20240818_152850'
+    new_file = not os.path.exists(path)
+    with open(path, 'a', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        if new_file:
+            writer.writerow(['snapshot_time', 'same_as'])
+        writer.writerow([snapshot_time, same_as])
+
+
+def read_unchanged_snapshots(path=unchanged_snapshots_file):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', newline='', encoding='utf-8') as file:
+        return [(row['snapshot_time'], row['same_as']) for row in csv.DictReader(file)]
+
+
+def scrape_unchanged(json_folder=json_folder):
+    # set by 01b_fingerprint.py, cleared by 01_extract_json.py at the start of the next scrape
+    return os.path.exists(os.path.join(json_folder, unchanged_marker_filename))
@@ -0,0 +1,100 @@
+import json
+import time
+from html.parser import HTMLParser
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Browserless fast path for 01_extract_json.py: fetch the product pages over a pooled keep-alive
+# HTTP session and pull the script#__NEXT_DATA__ JSON out of the HTML while it streams in.
+
+headers = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml',
+}
+
+
+class NextDataParser(HTMLParser):
+    # collects the text of script#__NEXT_DATA__ and, when asked for, the href of a[data-testid="page-last"]
+    def __init__(self, want_last_page=False):
+        super().__init__()
+        self.want_last_page = want_last_page
+        self.in_next_data = False
+        self.next_data = None
+        self.last_page_href = None
+        self._chunks = []
+
+    @property
+    def done(self):
+        return self.next_data is not None and (self.last_page_href is not None or not self.want_last_page)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'script' and attrs.get('id') == '__NEXT_DATA__':
+            self.in_next_data = True
+        elif tag == 'a' and attrs.get('data-testid') == 'page-last':
+            self.last_page_href = attrs.get('href')
+
+    def handle_data(self, data):
+        if self.in_next_data:
+            self._chunks.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == 'script' and self.in_next_data:
+            self.in_next_data = False
+            self.next_data = ''.join(self._chunks)
+
+
+def header_charset(content_type):
+    # the charset a Content-Type header names, e.g. 'text/html; charset=utf-8' -> 'utf-8', else None
+    for parameter in (content_type or '').split(';')[1:]:
+        name, _, value = parameter.partition('=')
+        if name.strip().lower() == 'charset' and value.strip(' "\''):
+            return value.strip(' "\'')
+    return None
+
+
+def make_session(pool_size):
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def fetch_next_data(session, url, want_last_page=False, chunk_size=64 * 1024, timeout=30):
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        # requests assumes ISO-8859-1 for text/html without a charset, which turns 'Rosé' into 'RosÃ©'.
+        # The pages are UTF-8 unless the header says otherwise
+        response.encoding = header_charset(response.headers.get('Content-Type')) or 'utf-8'
+
+        parser = NextDataParser(want_last_page=want_last_page)
+        chunks = response.iter_content(chunk_size=chunk_size, decode_unicode=True)
+        for chunk in chunks:
+            parser.feed(chunk)
+            if parser.done:
+                break
+
+        # read (without parsing) whatever is left so the connection goes back to the pool
+        for _ in chunks:
+            pass
+
+    if parser.next_data is None:
+        raise ValueError(f"No __NEXT_DATA__ script found in {url}")
+
+    # Load the JSON content into a Python dictionary
+    return json.loads(parser.next_data), parser.last_page_href
+
+
+def fetch_next_data_with_retries(session, url, retries, backoff, want_last_page=False):
+    for attempt in range(retries + 1):
+        try:
+            return fetch_next_data(session, url, want_last_page=want_last_page)
+        except (requests.RequestException, ValueError) as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+            print(f"Failed to fetch {url} ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
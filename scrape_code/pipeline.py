@@ -0,0 +1,254 @@
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import pyarrow.parquet as pq
+
+from fingerprints import scrape_unchanged
+
+# One entry point for the whole scrape: extract -> fingerprint -> csv -> archive -> scd.
+# 02_combine_json.py isn't a stage: products_extracted.json is optional, --csv-args --combined-json writes it.
+# Every stage runs one of the numbered scripts and declares the files it reads and writes. A stage is skipped
+# when its inputs have the same contents as the last time it ran and its outputs are still there.
+# Every run appends the wall time, peak RSS and row counts of each stage to metrics/pipeline_runs.jsonl.
+
+# all paths are relative to the folder of this file, where the scripts expect to run
+root = os.path.dirname(os.path.abspath(__file__))
+
+state_file = 'pipeline_state.json'
+metrics_file = 'metrics/pipeline_runs.jsonl'
+
+page_dumps = 'temp/json_dump_page_*.json'
+
+
+def count_files(pattern):
+    return len(glob.glob(os.path.join(root, pattern)))
+
+
+def count_csv_rows(path):
+    path = os.path.join(root, path)
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r', newline='', encoding='utf-8') as file:
+        return max(sum(1 for _ in csv.reader(file)) - 1, 0)
+
+
+def count_parquet_rows(path):
+    path = os.path.join(root, path)
+    return pq.ParquetFile(path).metadata.num_rows if os.path.exists(path) else 0
+
+
+def latest(pattern):
+    files = sorted(glob.glob(os.path.join(root, pattern)))
+    return os.path.relpath(files[-1], root) if files else None
+
+
+# name, script, inputs, outputs, row counts after the stage ran, and whether the stage has nothing to do when
+# 01b_fingerprint.py found the scrape unchanged.
+# A stage without inputs always runs, a stage whose inputs are all missing has nothing to do
+stages = [
+    {
+        'name': 'extract',
+        'script': '01_extract_json.py',
+        'inputs': [],
+        'outputs': [page_dumps],
+        'rows': lambda: {'pages': count_files(page_dumps)},
+        'after_fingerprint': False,
+    },
+    {
+        'name': 'fingerprint',
+        'script': '01b_fingerprint.py',
+        'inputs': [page_dumps, 'archive/last_fingerprints.json'],
+        'outputs': ['temp/fingerprints.json'],
+        'rows': lambda: {'pages': count_files(page_dumps)},
+        'after_fingerprint': False,
+    },
+    {
+        'name': 'csv',
+        'script': '03_create_csv.py',
+        'inputs': [page_dumps],
+        'outputs': ['temp/products_data.csv'],
+        'rows': lambda: {'products': count_csv_rows('temp/products_data.csv')},
+        'after_fingerprint': True,
+    },
+    {
+        'name': 'archive',
+        'script': '04_process.py',
+        'inputs': [page_dumps, 'temp/products_extracted.json', 'temp/products_data.csv', 'temp/fingerprints.json'],
+        'outputs': ['archive/manifests/*.json'],
+        'rows': lambda: {'products': count_parquet_rows(latest('archive/parquet/*.parquet') or '')},
+        'after_fingerprint': True,
+    },
+    {
+        'name': 'scd',
+        'script': '05_scd.py',
+        'inputs': [
+            'archive/parquet/*.parquet', 'archive/manifests/*.json', 'archive/csv/*.csv',
+            'archive/unchanged_snapshots.csv'
+        ],
+        'outputs': [
+            'scd/qantas_bonuspoints_true.csv', 'scd/qantas_bonuspoints_true_state.csv',
+            'scd/qantas_bonuspoints_current.parquet', 'scd/qantas_bonuspoints_history.parquet',
+            'scd/qantas_bonuspoints_changes.parquet'
+        ],
+        'rows': lambda: {
+            'scd': count_csv_rows('scd/qantas_bonuspoints_true.csv'),
+            'current': count_parquet_rows('scd/qantas_bonuspoints_current.parquet'),
+            'history': count_parquet_rows('scd/qantas_bonuspoints_history.parquet'),
+            'changes': count_parquet_rows('scd/qantas_bonuspoints_changes.parquet'),
+        },
+        'after_fingerprint': True,
+    },
+]
+stage_names = [stage['name'] for stage in stages]
+
+
+def load_state():
+    path = os.path.join(root, state_file)
+    if not os.path.exists(path):
+        return {'stages': {}, 'digests': {}}
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_state(state):
+    with open(os.path.join(root, state_file), 'w', encoding='utf-8') as file:
+        json.dump(state, file, indent=4, sort_keys=True)
+
+
+def file_digest(path, digests):
+    # sha256 of the file, only re-read when its size or modification time changed
+    stat = os.stat(os.path.join(root, path))
+    cached = digests.get(path)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+    sha = hashlib.sha256()
+    with open(os.path.join(root, path), 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            sha.update(chunk)
+    digests[path] = [stat.st_size, stat.st_mtime_ns, sha.hexdigest()]
+    return digests[path][2]
+
+
+def input_files(stage):
+    return sorted({os.path.relpath(f, root) for pattern in stage['inputs'] for f in glob.glob(os.path.join(root, pattern))})
+
+
+def input_signature(files, digests):
+    sha = hashlib.sha256()
+    for path in files:
+        sha.update(f'{path}\0{file_digest(path, digests)}\n'.encode())
+    return sha.hexdigest()
+
+
+def outputs_exist(stage):
+    return all(glob.glob(os.path.join(root, pattern)) for pattern in stage['outputs'])
+
+
+def vm_hwm(pid):
+    # peak resident set size of a running process in kB, None when /proc is not available
+    try:
+        with open(f'/proc/{pid}/status', 'r') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def run_script(script, args):
+    # run the script in its own process and return (exit code, peak RSS in MB)
+    process = subprocess.Popen([sys.executable, script] + args, cwd=root)
+    if not hasattr(os, 'wait4'):
+        return process.wait(), None
+
+    # the child's ru_maxrss starts from the RSS of this process at fork time, so on Linux its peak is
+    # sampled from /proc while it runs and ru_maxrss is only used where that is not available
+    peak_kb = None
+    while True:
+        hwm = vm_hwm(process.pid)
+        if hwm is not None:
+            peak_kb = max(peak_kb or 0, hwm)
+        pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+        if pid:
+            break
+        time.sleep(0.05)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if peak_kb is None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak_kb = usage.ru_maxrss / 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+    return process.returncode, round(peak_kb / 1024, 1)
+
+
+def run(selected, script_args, force=False):
+    state = load_state()
+    metrics = {'run_started': datetime.now().isoformat(timespec='seconds'), 'stages': []}
+    run_start = time.perf_counter()
+    exit_code = 0
+
+    for stage in stages:
+        if stage['name'] not in selected:
+            continue
+        record = {'stage': stage['name'], 'status': 'ran', 'wall_time_s': 0.0, 'peak_rss_mb': None, 'rows': {}}
+        metrics['stages'].append(record)
+
+        files = input_files(stage)
+        signature = input_signature(files, state['digests']) if stage['inputs'] else None
+        if stage['after_fingerprint'] and scrape_unchanged(os.path.join(root, 'temp')):
+            record['status'] = 'skipped: scrape unchanged'
+        elif stage['inputs'] and not files:
+            record['status'] = 'skipped: no inputs'
+        elif not force and signature is not None and state['stages'].get(stage['name']) == signature and outputs_exist(stage):
+            record['status'] = 'skipped: inputs unchanged'
+        if record['status'] != 'ran':
+            print(f"[{stage['name']}] {record['status']}")
+            continue
+
+        print(f"[{stage['name']}] running {stage['script']}")
+        start = time.perf_counter()
+        returncode, record['peak_rss_mb'] = run_script(stage['script'], script_args.get(stage['name'], []))
+        record['wall_time_s'] = round(time.perf_counter() - start, 3)
+        if returncode != 0:
+            record['status'] = f'failed: exit code {returncode}'
+            exit_code = returncode
+            print(f"[{stage['name']}] {record['status']}")
+            break
+        record['rows'] = stage['rows']()
+        state['stages'][stage['name']] = signature
+        save_state(state)
+        print(f"[{stage['name']}] done in {record['wall_time_s']}s, peak RSS {record['peak_rss_mb']} MB, {record['rows']}")
+
+    metrics['wall_time_s'] = round(time.perf_counter() - run_start, 3)
+    path = os.path.join(root, metrics_file)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write(json.dumps(metrics) + '\n')
+    return exit_code
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the scrape pipeline: ' + ' -> '.join(stage_names))
+    parser.add_argument('--from', dest='first', choices=stage_names, default=stage_names[0], help='first stage to run')
+    parser.add_argument('--to', dest='last', choices=stage_names, default=stage_names[-1], help='last stage to run')
+    parser.add_argument('--force', action='store_true', help='run the stages even when their inputs are unchanged')
+    parser.add_argument('--extract-args', default='', help="arguments for 01_extract_json.py, e.g. '--extractor http'")
+    parser.add_argument('--csv-args', default='', help="arguments for 03_create_csv.py, e.g. '--combined-json'")
+    parser.add_argument('--scd-args', default='', help="arguments for 05_scd.py, e.g. '--full-rebuild'")
+    args = parser.parse_args()
+
+    selected = stage_names[stage_names.index(args.first):stage_names.index(args.last) + 1]
+    script_args = {
+        'extract': shlex.split(args.extract_args),
+        'csv': shlex.split(args.csv_args),
+        'scd': shlex.split(args.scd_args),
+    }
+    sys.exit(run(selected, script_args, force=args.force))
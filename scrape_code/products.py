@@ -0,0 +1,138 @@
+import csv
+import json
+import os
+import re
+
+# Streams the products out of the json_dump_page_{page_number}.json files one at a time, so that
+# building products_data.csv (and optionally products_extracted.json) never holds the whole catalogue.
+
+# Define CSV file headers, including five columns for case variants
+fieldnames = [
+    'name',
+    'key',
+    'slug',
+    'casevariant_1',
+    'casevariant_2',
+    'casevariant_3',
+    'casevariant_4',
+    'casevariant_5',
+    'currentprice_cashprice',
+    'currentprice_bonusPoint',
+    'validfrom',
+    'validto'
+]
+
+
+def page_dump_files(json_folder):
+    # json_dump_page_{page_number}.json files, in page order
+    json_files = [f for f in os.listdir(json_folder) if f.startswith('json_dump_page_') and f.endswith('.json')]
+    return sorted(json_files, key=lambda f: int(re.sub(r'\D', '', f) or 0))
+
+
+def iter_products(json_folder, json_files=None):
+    for json_file in json_files if json_files is not None else page_dump_files(json_folder):
+        file_path = os.path.join(json_folder, json_file)
+        with open(file_path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+
+        # Check if the data is a dictionary and contains the necessary structure
+        if isinstance(data, dict):
+            try:
+                # Extract products if the key exists
+                product_list = data['props']['pageProps'].get('productSearchResults', {}).get('products', [])
+                if product_list:
+                    yield from product_list
+                else:
+                    print(f"No products found in {json_file}.")
+            except KeyError as e:
+                print(f"Error: {e} key not found in the JSON structure of {json_file}.")
+        else:
+            print(f"Unexpected data type in {json_file}. Expected a dictionary.")
+
+
+def extract_info(product):
+    # Extract relevant information from each product
+    extracted_info = {
+        "name": product.get("name", None),
+        "key": product.get("key", None),
+        "slug": product.get("slug", None),
+        "casevariant_1": None,
+        "casevariant_2": None,
+        "casevariant_3": None,
+        "casevariant_4": None,
+        "casevariant_5": None,
+        "currentprice_cashprice": None,
+        "currentprice_bonusPoint": None,
+        "validfrom": None,
+        "validto": None
+    }
+
+    # Extract information from the 'variants' list if it exists
+    variants = product.get("variants", [])
+    if variants:
+        variant = variants[0]  # Assuming we're interested in the first variant
+
+        # Extract case variants (up to 5) if they exist, otherwise use displayQuantity
+        case_variants = variant.get("allAttributes", {}).get("caseVariants", [])
+        if case_variants:
+            for i, case_variant in enumerate(case_variants[:5]):
+                extracted_info[f"casevariant_{i+1}"] = case_variant.get("key", None)
+        else:
+            # Fallback to 'displayQuantity' if no 'caseVariants' are found
+            extracted_info["casevariant_1"] = variant.get("allAttributes", {}).get("displayQuantity", None)
+
+        # Extract pricing information (if it exists)
+        current_price = variant.get("currentPrice", {})
+        extracted_info["currentprice_cashprice"] = current_price.get("cashPrice", {}).get("amount", None)
+        extracted_info["currentprice_bonusPoint"] = current_price.get("bonusPoint", None)
+        extracted_info["validfrom"] = current_price.get("validFrom", None)
+        extracted_info["validto"] = current_price.get("validUntil", None)
+
+    return extracted_info
+
+
+class CombinedJsonWriter:
+    # Writes the same bytes as json.dump(products, file, indent=4), one product at a time.
+    # The file is only created once there is a product to write
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def write(self, product):
+        if self.file is None:
+            self.file = open(self.path, 'w', encoding='utf-8')
+            self.file.write('[\n')
+        else:
+            self.file.write(',\n')
+        self.file.write('\n'.join('    ' + line for line in json.dumps(product, indent=4).split('\n')))
+
+    def close(self):
+        if self.file is not None:
+            self.file.write('\n]')
+            self.file.close()
+
+
+def write_products(products, csv_path=None, json_path=None):
+    # Single pass over the products, writing the csv rows and/or the combined JSON as they come
+    csv_file = open(csv_path, 'w', newline='', encoding='utf-8') if csv_path else None
+    json_writer = CombinedJsonWriter(json_path) if json_path else None
+    count = 0
+    try:
+        if csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+            # Write the header
+            writer.writeheader()
+
+        for product in products:
+            if csv_file:
+                # Write the extracted data as a row in the CSV file
+                writer.writerow(extract_info(product))
+            if json_writer:
+                json_writer.write(product)
+            count += 1
+    finally:
+        if csv_file:
+            csv_file.close()
+        if json_writer:
+            json_writer.close()
+    return count
@@ -0,0 +1,159 @@
+import os
+import sys
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# schema.py is shared with the app in the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from schema import date_dtype, open_date
+
+# Slowly changing dimension (type 2) build for the archived product snapshots, in plain pandas.
+# Used by 05_scd.py; each step mirrors one of the SQL queries the script used to run through pandasql.
+
+checksum_columns = [
+    'wine_name', 'slug', 'casevariant_1', 'casevariant_2', 'casevariant_3',
+    'casevariant_4', 'casevariant_5', 'currentprice_cashprice',
+    'currentprice_bonusPoint', 'validfrom', 'validto'
+]
+
+# Read every snapshot with the same types, so the checksums (and the output file) don't depend on
+# which snapshots happen to be loaded together
+text_columns = [
+    'wine_name', 'wine_key', 'slug', 'casevariant_1', 'casevariant_2', 'casevariant_3',
+    'casevariant_4', 'casevariant_5', 'validfrom', 'validto'
+]
+# The number columns, with their type when the whole history only has whole numbers (the bonus points fit in
+# 32 bits). The original script read the archived csvs with pandas, which makes a column float64 as soon as one
+# value anywhere is missing or has a fraction, and then hashes (and writes) 5000 points as '5000.0' and a missing
+# value as 'nan'. The same happens here: see float_columns
+number_columns = {'currentprice_cashprice': 'Int64', 'currentprice_bonusPoint': 'Int32'}
+
+scd_columns = ['wine_key', 'eff_from', 'eff_to', 'rec_deleted_flag', 'record_checksum'] + checksum_columns
+version_columns = ['wine_key', 'record_checksum', 'eff_from', 'eff_to']
+
+# Dates are datetime64[s] (see schema.py), and written out as 'YYYY-MM-DD' like before
+
+# 'md5' gives the same hex digests as the row by row hashlib.md5 the existing scd files were built with:
+# missing text is hashed as 'None' and the numbers as explained above number_columns.
+# 'fast' uses pandas' vectorized 64-bit hash instead, 16 hex characters so the two can't be mixed up
+checksum_modes = {'md5': 32, 'fast': 16}
+checksum_chunk_size = 100_000
+
+
+def is_float_column(values):
+    # whether the original script would have read this column as float64
+    if values.dtype == object or isinstance(values.dtype, pd.StringDtype):
+        # as written in the scd csv: '5000.0', or an empty field
+        return bool(values.isna().any() or values.astype(str).str.contains('.', regex=False).any())
+    numbers = values.astype('float64')
+    return bool(numbers.isna().any() or (numbers % 1 != 0).any())
+
+
+def float_columns(*frames):
+    # the number columns that are float64 in any of the frames, which then are float64 for the whole history
+    return sorted({col for df in frames for col in number_columns if col in df.columns and is_float_column(df[col])})
+
+
+def coerce_types(df, floats=()):
+    for col in text_columns:
+        # categoricals from the snapshot loader stay categorical until daily_records
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            # missing text is hashed as 'None' (as it came back from SQLite before)
+            df[col] = df[col].astype(object).where(df[col].notna(), None)
+    for col, dtype in number_columns.items():
+        if col in df.columns:
+            df[col] = df[col].astype('float64' if col in floats else dtype)
+    return df
+
+
+def decategorise(df):
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object).where(df[col].notna(), None)
+    return df
+
+
+def record_checksums(df, mode='md5', chunk_size=checksum_chunk_size):
+    if mode not in checksum_modes:
+        raise ValueError(f"Unknown checksum mode '{mode}', expected one of {list(checksum_modes)}")
+
+    checksums = []
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+
+        # str() of every value, concatenated column by column
+        joined = chunk[checksum_columns[0]].astype(object).map(str)
+        for col in checksum_columns[1:]:
+            joined = joined + chunk[col].astype(object).map(str)
+
+        if mode == 'md5':
+            checksums.extend(hashlib.md5(s.encode()).hexdigest() for s in joined)
+        else:
+            hashes = pd.util.hash_array(joined.to_numpy(dtype=object), categorize=False)
+            checksums.extend(f'{h:016x}' for h in hashes.tolist())
+
+    return pd.Series(checksums, index=df.index, dtype=object)
+
+
+def daily_records(df_combined, checksum_mode='md5'):
+    # select only one record per key and snapshot date, the one from the latest snapshot_time.
+    # the sort is stable, so a key listed twice in one snapshot keeps its first row
+    df_02 = df_combined.assign(snapshot_date=df_combined['snapshot_time'].dt.floor('D').astype(date_dtype))
+    df_02 = df_02.sort_values('snapshot_time', ascending=False, kind='stable')
+    df_02 = df_02.drop_duplicates(subset=['wine_key', 'snapshot_date'], keep='first').reset_index(drop=True)
+    # plain text from here on, the checksums hash missing values as 'None'
+    df_02 = decategorise(df_02)
+
+    # Create checksums to detect changes based on the specified changing columns
+    df_02['record_checksum'] = record_checksums(df_02, mode=checksum_mode)
+    return df_02
+
+
+def aggregate_versions(df_02):
+    # get the min and max snapshot_date for each wine_key and checksum
+    return (
+        df_02.groupby(['wine_key', 'record_checksum'], as_index=False, sort=False, dropna=False)
+        .agg(eff_from=('snapshot_date', 'min'), eff_to=('snapshot_date', 'max'))
+    )
+
+
+def merge_versions(*frames):
+    # versions seen in several batches keep the earliest eff_from and the latest eff_to
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=version_columns)
+    return (
+        pd.concat(frames, ignore_index=True)
+        .groupby(['wine_key', 'record_checksum'], as_index=False, sort=False, dropna=False)
+        .agg(eff_from=('eff_from', 'min'), eff_to=('eff_to', 'max'))
+    )
+
+
+def build_scd(df_03, df_02_distinct):
+    # get the global latest eff_to, and the latest eff_to of each key
+    global_max_eff_to = df_03['eff_to'].max()
+    max_eff_to = df_03.groupby('wine_key', sort=False)['eff_to'].transform('max')
+
+    # the latest version of each key stays open. it is flagged as deleted when the key
+    # was missing from the latest snapshot
+    is_latest = (df_03['eff_to'] == max_eff_to).to_numpy()
+    is_deleted = (max_eff_to != global_max_eff_to).to_numpy()
+
+    df_08 = pd.DataFrame({
+        'wine_key': df_03['wine_key'].to_numpy(),
+        'eff_from': df_03['eff_from'].to_numpy(),
+        'eff_to': np.where(is_latest, open_date, df_03['eff_to'].to_numpy()),
+        'rec_deleted_flag': (is_latest & is_deleted).astype('int8'),
+        'record_checksum': df_03['record_checksum'].to_numpy(),
+    })
+
+    # join back the original data. only select the checksum_columns
+    df_09 = df_08.merge(
+        df_02_distinct[['record_checksum'] + checksum_columns].drop_duplicates(subset='record_checksum'),
+        on='record_checksum',
+        how='left'
+    )
+    df_09 = df_09.sort_values(['wine_key', 'eff_from'], ascending=[True, False], kind='stable')
+    return df_09[scd_columns].reset_index(drop=True)
@@ -0,0 +1,157 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import archive_store
+from fingerprints import read_unchanged_snapshots
+
+# Typed columnar copies of the archived products_data.csv snapshots.
+# 04_process.py writes one next to every archived csv, 05_scd.py reads them instead of re-parsing the csv.
+# Snapshots without a parquet copy are read from the blob store (archive_store.py) or the old archive/csv folder.
+# Scrapes recorded as unchanged by 01b_fingerprint.py are listed too, as the archived snapshot they repeat.
+# Run this file directly to write the parquet copies for csv snapshots archived before this existed.
+
+archive_csv_folder = 'archive/csv'
+archive_parquet_folder = 'archive/parquet'
+
+text_columns = [
+    'name', 'key', 'slug', 'casevariant_1', 'casevariant_2', 'casevariant_3',
+    'casevariant_4', 'casevariant_5', 'validfrom', 'validto'
+]
+
+snapshot_schema = pa.schema([
+    ('name', pa.string()),
+    ('key', pa.string()),
+    ('slug', pa.string()),
+    ('casevariant_1', pa.string()),
+    ('casevariant_2', pa.string()),
+    ('casevariant_3', pa.string()),
+    ('casevariant_4', pa.string()),
+    ('casevariant_5', pa.string()),
+    ('currentprice_cashprice', pa.float64()),
+    ('currentprice_bonusPoint', pa.int64()),
+    ('validfrom', pa.string()),
+    ('validto', pa.string()),
+    ('snapshot_time', pa.timestamp('s')),
+])
+
+snapshot_columns = [field.name for field in snapshot_schema]
+
+
+def snapshot_time_from_filename(filename):
+    # Archived files are named e.g. '20240818_152850_products_data.csv'
+    timestamp_str = filename.split('_')[0] + filename.split('_')[1]
+    return datetime.strptime(timestamp_str, '%Y%m%d%H%M%S')  # Convert string to datetime
+
+
+def read_snapshot_csv(file, snapshot_time):
+    df = pd.read_csv(file, dtype={col: str for col in text_columns})
+    df['currentprice_cashprice'] = df['currentprice_cashprice'].astype('float64')
+    df['currentprice_bonusPoint'] = df['currentprice_bonusPoint'].astype('Int64')
+    df['snapshot_time'] = snapshot_time  # Add the snapshot_time column to the DataFrame
+    return df
+
+
+def write_snapshot_parquet(df, file):
+    table = pa.Table.from_pandas(df[snapshot_columns], schema=snapshot_schema, preserve_index=False)
+    pq.write_table(table, file)
+
+
+def read_snapshot_parquet(file, columns=None):
+    # only the requested columns are read, straight from the memory mapped file
+    table = pq.read_table(file, columns=columns, memory_map=True)
+    return table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+
+
+def _list_folder(folder, extension):
+    if not os.path.isdir(folder):
+        return []
+    return [(os.path.join(folder, f), snapshot_time_from_filename(f)) for f in os.listdir(folder) if f.endswith(extension)]
+
+
+def list_snapshots(from_date=None):
+    # one (file, snapshot_time) per snapshot, preferring the parquet copy over the archived csv.
+    # file is the manifest of the run when the csv is in the blob store
+    snapshots = {}
+    for file, snapshot_time in _list_folder(archive_csv_folder, '.csv'):
+        snapshots[f'{snapshot_time:%Y%m%d_%H%M%S}_products_data'] = (file, snapshot_time)
+    for timestamp, _ in archive_store.iter_snapshots('products_data.csv', archive_store.archive_folder):
+        snapshots[f'{timestamp}_products_data'] = (
+            archive_store.manifest_path(timestamp, archive_store.archive_folder), snapshot_time_from_filename(timestamp)
+        )
+    for file, snapshot_time in _list_folder(archive_parquet_folder, '.parquet'):
+        snapshots[f'{snapshot_time:%Y%m%d_%H%M%S}_products_data'] = (file, snapshot_time)
+
+    # an unchanged scrape reads the file of the snapshot it repeats, with its own snapshot_time
+    for snapshot_time, same_as in read_unchanged_snapshots():
+        name = f'{same_as}_products_data'
+        if name in snapshots:
+            snapshots[f'{snapshot_time}_products_data'] = (snapshots[name][0], snapshot_time_from_filename(snapshot_time))
+
+    return [
+        snapshots[name] for name in sorted(snapshots)
+        if from_date is None or snapshots[name][1].strftime('%Y-%m-%d') >= from_date
+    ]
+
+
+def read_snapshot_table(file, snapshot_time, columns=None):
+    # the snapshot as an arrow table with the snapshot_schema types, whatever file it was read from
+    if file.endswith('.parquet'):
+        table = pq.read_table(file, columns=columns, memory_map=True)
+    else:
+        table = pa.Table.from_pandas(read_snapshot(file, snapshot_time)[snapshot_columns], schema=snapshot_schema, preserve_index=False)
+        table = table.select(columns) if columns is not None else table
+    if 'snapshot_time' in table.column_names:
+        # the file may be shared with repeats of the snapshot
+        snapshot_times = pa.array(np.full(table.num_rows, np.datetime64(snapshot_time, 's')), type=pa.timestamp('s'))
+        table = table.set_column(table.schema.get_field_index('snapshot_time'), 'snapshot_time', snapshot_times)
+    return table
+
+
+def read_snapshots(snapshots, columns=None, workers=1, pool='thread', categories=()):
+    # all the snapshots in one DataFrame, read by a pool of workers. Arrow releases the GIL while reading
+    # parquet, so threads are enough there; a process pool also spreads the csv parsing over the cores.
+    # map keeps the order of the snapshots, so the result is the same for any number of workers
+    files = [file for file, _ in snapshots]
+    snapshot_times = [snapshot_time for _, snapshot_time in snapshots]
+    if workers > 1 and len(snapshots) > 1:
+        executor = ThreadPoolExecutor if pool == 'thread' else ProcessPoolExecutor
+        with executor(max_workers=workers) as executor:
+            tables = list(executor.map(read_snapshot_table, files, snapshot_times, [columns] * len(files)))
+    else:
+        tables = [read_snapshot_table(file, snapshot_time, columns) for file, snapshot_time in snapshots]
+
+    # the tables become the chunks of one table without copying, and are converted to pandas once.
+    # categories are the text columns to read as categoricals, e.g. the keys repeated in every snapshot
+    table = pa.concat_tables(tables)
+    return table.to_pandas(categories=list(categories), types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+
+
+def read_snapshot(file, snapshot_time, columns=None):
+    if file.endswith('.parquet'):
+        df = read_snapshot_parquet(file, columns=columns)
+        if 'snapshot_time' in df.columns:
+            df['snapshot_time'] = snapshot_time  # the file may be shared with repeats of the snapshot
+        return df
+    if file.endswith('.json'):
+        manifest = archive_store.read_manifest(file)
+        df = read_snapshot_csv(archive_store.open_file(manifest, 'products_data.csv', archive_store.archive_folder), snapshot_time)
+        return df if columns is None else df[columns]
+    df = read_snapshot_csv(file, snapshot_time)
+    return df if columns is None else df[columns]
+
+
+if __name__ == '__main__':
+    os.makedirs(archive_parquet_folder, exist_ok=True)
+    for file, snapshot_time in list_snapshots():
+        timestamp = snapshot_time.strftime('%Y%m%d_%H%M%S')
+        parquet_file = os.path.join(archive_parquet_folder, f'{timestamp}_products_data.parquet')
+        # repeats recorded by 01b_fingerprint.py read the file of another snapshot, they need no copy
+        if os.path.basename(file).startswith(timestamp) and not os.path.exists(parquet_file):
+            write_snapshot_parquet(read_snapshot(file, snapshot_time), parquet_file)
+            print(f"Wrote {parquet_file}")
@@ -0,0 +1,99 @@
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+# Wine name search for the app. Built once per dataset load: every 3 character substring of the normalised
+# names points at the rows containing it, so a query only looks at the rows sharing its trigrams instead of
+# running str.contains over the whole table. Queries of 1 or 2 characters match most names anyway, so they
+# scan the names from the lowest score and stop at the first k matches.
+
+
+def normalise(text):
+    # lowercase, without accents, e.g. 'Rosé' -> 'rose'
+    text = unicodedata.normalize('NFKD', str(text) if text is not None else '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).casefold()
+
+
+def ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class SearchIndex:
+    def __init__(self, names, scores, fuzzy_threshold=0.5):
+        # names and scores are in row order; results are row positions, the lowest score first
+        self.names = [normalise(name) for name in names]
+        self.fuzzy_threshold = fuzzy_threshold
+
+        # rank of each row by score, missing scores last
+        scores = np.asarray(scores, dtype='float64')
+        order = np.lexsort((np.arange(len(scores)), np.nan_to_num(scores, nan=np.inf)))
+        self.order = order
+        self.rank = np.empty(len(scores), dtype=np.int64)
+        self.rank[order] = np.arange(len(scores))
+
+        postings = defaultdict(list)
+        for position, name in enumerate(self.names):
+            for gram in ngrams(name, 3):
+                postings[gram].append(position)
+        self.postings = {gram: np.array(positions, dtype=np.int32) for gram, positions in postings.items()}
+
+    def _query_grams(self, query):
+        return ngrams(query, 3)
+
+    def candidates(self, query):
+        # rows containing every n-gram of the query: all rows matching the query, plus a few false positives
+        posting_lists = sorted((self.postings.get(gram) for gram in self._query_grams(query)), key=lambda p: 0 if p is None else len(p))
+        if not posting_lists or posting_lists[0] is None:
+            return np.array([], dtype=np.int32)
+        result = posting_lists[0]
+        for positions in posting_lists[1:]:
+            result = np.intersect1d(result, positions, assume_unique=True)
+            if result.size == 0:
+                break
+        return result
+
+    def fuzzy_candidates(self, query):
+        # rows sharing at least fuzzy_threshold of the query's trigrams
+        grams = self._query_grams(query)
+        posting_lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not posting_lists:
+            return np.array([], dtype=np.int32)
+        positions, counts = np.unique(np.concatenate(posting_lists), return_counts=True)
+        return positions[counts >= self.fuzzy_threshold * len(grams)]
+
+    def search(self, query, k=10, allowed=None, fuzzy=False):
+        query = normalise(query)
+        if not query:
+            return np.array([], dtype=np.int64)
+
+        if len(query) < 3:
+            return self.scan(query, k, allowed)
+
+        if fuzzy:
+            positions = self.fuzzy_candidates(query)
+            verify = False
+        else:
+            positions = self.candidates(query)
+            verify = len(query) > 3
+        if allowed is not None:
+            positions = positions[allowed[positions]]
+
+        # walk the candidates from the lowest score, checking for the full query, until there are k results
+        results = []
+        for position in positions[np.argsort(self.rank[positions], kind='stable')]:
+            if not verify or query in self.names[position]:
+                results.append(position)
+                if len(results) == k:
+                    break
+        return np.array(results, dtype=np.int64)
+
+    def scan(self, query, k=10, allowed=None):
+        # the first k rows containing the query, from the lowest score
+        results = []
+        for position in self.order:
+            if (allowed is None or allowed[position]) and query in self.names[position]:
+                results.append(position)
+                if len(results) == k:
+                    break
+        return np.array(results, dtype=np.int64)
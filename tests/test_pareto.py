@@ -0,0 +1,65 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pareto import is_pareto_efficient, pareto_efficient, pareto_efficient_2d, pareto_layers, prefix_frontier
+
+
+def random_costs(n, columns, seed):
+    # small integers, so that there are plenty of ties and identical rows, with some inf and NaN
+    rng = np.random.default_rng(seed)
+    costs = rng.integers(0, 8, size=(n, columns)).astype('float64')
+    costs[rng.random((n, columns)) < 0.05] = np.inf
+    costs[rng.random((n, columns)) < 0.05] = np.nan
+    return costs
+
+
+def reference(costs):
+    # is_pareto_efficient of the rows without a missing value, the rows with one are never efficient
+    valid = ~np.isnan(costs).any(axis=1)
+    is_efficient = np.zeros(len(costs), dtype=bool)
+    is_efficient[valid] = is_pareto_efficient(costs[valid])
+    return is_efficient
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('n', [0, 1, 2, 10, 200])
+def test_pareto_efficient_2d_matches_the_reference(n, seed):
+    costs = random_costs(n, 2, seed)
+    assert (pareto_efficient_2d(costs) == reference(costs)).all()
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_prefix_frontier_matches_the_reference_under_every_threshold(seed):
+    costs = random_costs(300, 2, seed)
+    prices, cents = costs[:, 0], costs[:, 1]
+    mask = prefix_frontier(prices, cents)
+    for threshold in [-1, 0, 0.5, 1, 3, 3.5, 7, np.inf]:
+        under = prices <= threshold
+        assert (mask[under] == reference(costs[under])).all()
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('columns', [1, 3, 4])
+def test_pareto_efficient_matches_the_reference(columns, seed):
+    costs = random_costs(300, columns, seed)
+    assert (pareto_efficient(costs) == reference(costs)).all()
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('columns', [2, 3])
+def test_pareto_layers_peel_the_reference_frontier(columns, seed):
+    costs = random_costs(300, columns, seed)
+    layers = pareto_layers(costs, max_layers=3)
+    assert (layers[np.isnan(costs).any(axis=1)] == 0).all()
+
+    remaining = np.flatnonzero(~np.isnan(costs).any(axis=1))
+    for layer in [1, 2, 3]:
+        # identical rows share a layer, where is_pareto_efficient only marks the first of them
+        efficient = reference(costs[remaining])
+        on_frontier = (costs[remaining][:, None, :] == costs[remaining[efficient]][None, :, :]).all(axis=2).any(axis=1)
+        assert (layers[remaining[on_frontier]] == layer).all()
+        remaining = remaining[~on_frontier]
+    assert (layers[remaining] == 0).all()